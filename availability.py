@@ -0,0 +1,53 @@
+import pandas as pd
+
+from students_cleanup import TIME_RANGE_COLUMNS, time_in_minutes
+
+# Each student's possible lesson starts, compiled once when the students are loaded: per day, the quarter-hours a
+# lesson can start at in ascending order and as a bitmask, the ideal window first and the alternative days after.
+
+
+def compile_availability(students):
+    windows = []
+    for day_column, start_column, end_column in TIME_RANGE_COLUMNS:
+        # A lesson can start from the first quarter-hour after the start time up to the last one before the end time
+        first_starts = -(-time_in_minutes(students[start_column]) // 15)
+        last_starts = time_in_minutes(students[end_column]) // 15
+        windows.append(zip(students[day_column], optional_ints(first_starts), optional_ints(last_starts)))
+    return {index: compile_windows(student_windows) for index, *student_windows in zip(students.index, *windows)}
+
+
+def optional_ints(values):
+    return [None if pd.isna(value) else int(value) for value in values]
+
+
+def compile_student_availability(student):
+    return next(iter(compile_availability(pd.DataFrame([student])).values()))
+
+
+def compile_windows(windows):
+    starts = {}
+    for day, first_start, last_start in windows:
+        if isinstance(day, str) and day and first_start is not None and last_start is not None:
+            starts.setdefault(day, set()).update(range(first_start, last_start + 1))
+    (ideal_day, first_ideal_start, last_ideal_start) = windows[0]
+    return {'days': {day: tuple(sorted(day_starts)) for day, day_starts in starts.items()},
+            'masks': {day: sum(1 << start for start in day_starts) for day, day_starts in starts.items()},
+            'ideal': (ideal_day, first_ideal_start, last_ideal_start)}
+
+
+def available_starts(student_availability, rng=None):
+    if rng is None:
+        return student_availability['days']
+    # Packing lessons from either end of the window keeps the remaining free time in one block
+    return {day: starts[::-1] if rng.random() < 0.5 else starts
+            for day, starts in student_availability['days'].items()}
+
+
+def can_start_at(student_availability, day, start):
+    return start >= 0 and student_availability['masks'].get(day, 0) >> start & 1 == 1
+
+
+def is_ideal_start(student_availability, day, start):
+    ideal_day, first_ideal_start, last_ideal_start = student_availability['ideal']
+    return (day == ideal_day and first_ideal_start is not None and last_ideal_start is not None
+            and first_ideal_start <= start <= last_ideal_start)
@@ -0,0 +1,248 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import scheduler
+import students_cleanup
+import teachers_cleanup
+from formatter import print_schedules
+from profiling import timed_functions
+
+INSTRUMENTS = {"piano": 50, "chant": 15, "guitare": 12, "violon": 10, "batterie": 5, "ukulélé": 4, "basse": 2,
+               "saxophone": 2}
+LOCATIONS = ["lorraine", "rosemère"]
+WEEK_DAYS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi"]
+WEEKEND_DAYS = ["samedi", "dimanche"]
+FIRST_NAMES = ["emma", "léa", "alice", "chloé", "rose", "jade", "zoé", "florence", "charlotte", "béatrice", "noah",
+               "william", "thomas", "léo", "liam", "jacob", "nathan", "félix", "arthur", "louis", "mia", "olivia"]
+LAST_NAMES = ["tremblay", "gagnon", "roy", "côté", "bouchard", "gauthier", "morin", "lavoie", "fortin", "gagné",
+              "ouellet", "pelletier", "bélanger", "lévesque", "bergeron", "leblanc", "paquette", "girard", "simard"]
+
+# Functions timed from inside the ones calling them
+NESTED_FUNCTIONS = ['upper_bound', 'split_problem', 'process_family']
+# Size of the current registration files, the benchmark scales are multiples of it
+BASE_NB_OF_STUDENTS = 80
+BASE_NB_OF_TEACHERS = 9
+
+
+def generate_teachers(nb_of_teachers, rng):
+    rows = []
+    for teacher_number in range(nb_of_teachers):
+        teacher_name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[0]}. {teacher_number}"
+        instruments = rng.sample(list(INSTRUMENTS), rng.choice([1, 1, 2, 2, 3]))
+        if "piano" not in instruments and rng.random() < 0.5:
+            instruments.append("piano")
+        accept_new_student = rng.random() < 0.85
+        for day in rng.sample(WEEK_DAYS + WEEKEND_DAYS, rng.randint(1, 4)):
+            if day in WEEKEND_DAYS:
+                start_hour = rng.randint(8, 11)
+                end_hour = start_hour + rng.randint(4, 8)
+            else:
+                start_hour = rng.randint(13, 17)
+                end_hour = min(start_hour + rng.randint(3, 7), 21)
+            row = {'teacher_name': teacher_name, 'instrument': ", ".join(instruments), 'day': day,
+                   'location': rng.choice(LOCATIONS), 'start_time': f"{start_hour}:00", 'end_time': f"{end_hour}:00",
+                   'start_break_1': float('nan'), 'end_break_1': float('nan'), 'length_break_1': float('nan'),
+                   'start_break_2': float('nan'), 'end_break_2': float('nan'), 'length_break_2': float('nan'),
+                   'accept_new_student': accept_new_student}
+            if end_hour - start_hour >= 5:
+                break_hour = rng.randint(start_hour + 2, end_hour - 2)
+                row.update(start_break_1=f"{break_hour:02d}:00", end_break_1=f"{break_hour + 1:02d}:00",
+                           length_break_1=float(rng.choice([30, 30, 45])))
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def generate_students(nb_of_students, teachers, rng):
+    teachers_by_instrument = {}
+    for teacher in teachers.to_dict('records'):
+        for instrument in map(str.strip, teacher['instrument'].split(',')):
+            teachers_by_instrument.setdefault(instrument, set()).add(teacher['teacher_name'])
+
+    rows = []
+    while len(rows) < nb_of_students:
+        family_name = rng.choice(LAST_NAMES)
+        family = [generate_student(f"{rng.choice(FIRST_NAMES)} {family_name} {len(rows) + member}",
+                                   teachers_by_instrument, rng)
+                  for member in range(2 if rng.random() < 0.1 else 1)]
+        if len(family) == 2:
+            # Siblings come together, on the same day and usually at the same campus
+            family[1].update({key: family[0][key] for key in ('location', 'ideal_day', 'ideal_start_time',
+                                                               'ideal_end_time', 'can_be_realocated')})
+            for student, sibling in (family, reversed(family)):
+                student.update(simultaneous_family_class=True, sibling_name=sibling['student_name'])
+        rows.extend(family)
+    students = pd.DataFrame(rows[:nb_of_students])
+    pin_some_students(students, teachers, rng)
+    return students
+
+
+def generate_student(student_name, teachers_by_instrument, rng):
+    instrument = rng.choices(list(INSTRUMENTS), weights=list(INSTRUMENTS.values()))[0]
+    current_student = rng.random() < 0.5
+    preferred_teacher = float('nan')
+    if current_student and instrument in teachers_by_instrument and rng.random() < 0.8:
+        preferred_teacher = rng.choice(sorted(teachers_by_instrument[instrument]))
+    student = {'email': f"{student_name.replace(' ', '.')}@example.com", 'phone_number': "514-555-0000",
+               'student_name': student_name, 'want_lesson': rng.random() < 0.95, 'current_student': current_student,
+               'instrument': instrument, 'lesson_duration': rng.choice([30, 30, 30, 45, 45, 60]),
+               'preferred_teacher': preferred_teacher, 'location': rng.choice(LOCATIONS + [float('nan')]),
+               'can_be_realocated': rng.random() < 0.7, 'prioritise': "heure du cours",
+               'simultaneous_family_class': False, 'sibling_name': float('nan'), 'comment': float('nan'),
+               'assigned_teacher': float('nan'), 'assigned_day': float('nan'),
+               'assigned_start_time': float('nan'), 'assigned_duration': 30, 'age': str(rng.randint(5, 60))}
+    for number, suffix in enumerate(['ideal', 'alternative_1', 'alternative_2', 'alternative_3']):
+        if number and rng.random() < 0.4:
+            day, start_time, end_time = float('nan'), float('nan'), float('nan')
+        else:
+            day, start_time, end_time = generate_window(rng)
+        prefix, index = (suffix, '') if suffix == 'ideal' else ('alternative', suffix[-2:])
+        student[f"{prefix}_day{index}"] = day
+        student[f"{prefix}_start_time{index}"] = start_time
+        student[f"{prefix}_end_time{index}"] = end_time
+    return student
+
+
+def generate_window(rng):
+    day = rng.choice(WEEK_DAYS * 2 + WEEKEND_DAYS)
+    start_quarter = rng.randint(9 * 4, 13 * 4) if day in WEEKEND_DAYS else rng.randint(15 * 4, 19 * 4)
+    end_quarter = start_quarter + rng.randint(0, 16)
+    return day, scheduler.quarter_to_time(start_quarter), scheduler.quarter_to_time(end_quarter)
+
+
+def pin_some_students(students, teachers, rng):
+    # About 2% of the students keep a lesson decided by hand, in distinct slots of the teachers' hours
+    taken = set()
+    assigned_columns = ['assigned_teacher', 'assigned_day', 'assigned_start_time']
+    students[assigned_columns] = students[assigned_columns].astype(object)
+    for index in rng.sample(list(students.index), len(students) // 50):
+        teacher = teachers.iloc[rng.randrange(len(teachers))]
+        start = rng.randrange(scheduler.ceil_quarter(teacher['start_time']),
+                              scheduler.floor_quarter(teacher['end_time']) - 3)
+        if any((teacher['teacher_name'], teacher['day'], quarter) in taken for quarter in range(start, start + 4)):
+            continue
+        taken.update((teacher['teacher_name'], teacher['day'], quarter) for quarter in range(start, start + 4))
+        students.loc[index, assigned_columns] = [teacher['teacher_name'], teacher['day'],
+                                                 scheduler.quarter_to_time(start)]
+        students.loc[index, 'assigned_duration'] = 60
+
+
+def generate_problem(scale, seed):
+    rng = random.Random(seed)
+    teachers = generate_teachers(max(BASE_NB_OF_TEACHERS * scale, 1), rng)
+    students = generate_students(BASE_NB_OF_STUDENTS * scale, teachers, rng)
+    return students, teachers
+
+
+def replicate_input(input_file, scale, name_column, output_file):
+    # The cleanup scripts only accept the registration form export, so the real one is repeated with unique names
+    raw = pd.read_csv(input_file)
+    copies = []
+    for copy_number in range(scale):
+        copy = raw.copy()
+        if name_column is not None:
+            copy[name_column] = copy[name_column].astype(str) + f" {copy_number}"
+        copies.append(copy)
+    pd.concat(copies, ignore_index=True).to_csv(output_file, index=False)
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def benchmark_scale(scale, seed, working_directory):
+    students, teachers = generate_problem(scale, seed)
+    timings = {}
+    # The problem is prepared as for a run, the functions it calls are measured from inside it
+    with timed_functions([vars(scheduler)], NESTED_FUNCTIONS) as phases:
+        problem, timings['prepare_problem'] = timed(scheduler.prepare_problem, students, teachers)
+        students, teacher_index, student_registry = problem['students'], problem['teacher_index'], \
+            problem['student_registry']
+        (teachers_schedule, processed_students), timings['assign_students'] = timed(
+            scheduler.assign_students, teacher_index, student_registry)
+    call_timings = {function_name: phases.get(function_name, {'calls': 0, 'seconds': 0.0})
+                    for function_name in NESTED_FUNCTIONS}
+    timings['upper_bound'] = call_timings['upper_bound']['seconds']
+    timings['split_problem'] = call_timings['split_problem']['seconds']
+    timings['sibling_paths'] = call_timings['process_family']['seconds']
+    nb_of_greedy_students = sum(1 for assignment in processed_students.values() if assignment.teacher)
+
+    _, timings['improve_schedule'] = timed(scheduler.improve_schedule, teacher_index, student_registry,
+                                           teachers_schedule, processed_students)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, timings['print_schedules'] = timed(print_schedules, teachers, teachers_schedule, students)
+
+    students_input = os.path.join(working_directory, 'students_input.csv')
+    teachers_input = os.path.join(working_directory, 'teachers_input.csv')
+    replicate_input(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'students_input.csv'), scale,
+                    "Prénom ET Nom de famille de l'élève (S'il vous plait vérifier l'orthographe attentivement)",
+                    students_input)
+    replicate_input(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'teachers_input.csv'), scale,
+                    'teacher_name', teachers_input)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, timings['students_cleanup'] = timed(students_cleanup.main, students_input,
+                                               os.path.join(working_directory, 'students.csv'))
+        _, timings['teachers_cleanup'] = timed(teachers_cleanup.main, teachers_input,
+                                               os.path.join(working_directory, 'teachers.csv'))
+
+    return {'scale': scale, 'seed': seed, 'nb_of_students': len(students), 'nb_of_teacher_days': len(teachers),
+            'nb_of_sibling_calls': call_timings['process_family']['calls'],
+            'nb_of_greedy_assigned_students': nb_of_greedy_students, 'upper_bound': problem['upper_bound'],
+            'nb_of_independent_groups': len(problem['sub_problems']),
+            'nb_of_assigned_students': sum(1 for assignment in processed_students.values() if assignment.teacher),
+            'timings': {name: round(seconds, 4) for name, seconds in timings.items()}}
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_benchmarks(scales, seed, output_file):
+    run_information = {'commit': current_commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+                       'python': platform.python_version()}
+    results = []
+    with tempfile.TemporaryDirectory() as working_directory:
+        previous_directory = os.getcwd()
+        # print_schedules writes its visual file in the current directory
+        os.chdir(working_directory)
+        try:
+            for scale in scales:
+                result = dict(run_information, **benchmark_scale(scale, seed, working_directory))
+                print(f"x{scale}: {result['nb_of_students']} students, {result['nb_of_teacher_days']} teacher days, "
+                      + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in result['timings'].items()))
+                results.append(result)
+        finally:
+            os.chdir(previous_directory)
+
+    with open(output_file, 'a', encoding='utf-8') as file:
+        for result in results:
+            file.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scheduling tool on generated registrations')
+    parser.add_argument('-x', '--scales', type=int, nargs='+', default=[10, 30, 100],
+                        help='Sizes to benchmark, as multiples of the current registration files')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated registrations')
+    parser.add_argument('-o', '--output', default='benchmark_results.jsonl',
+                        help='JSON lines file the results are appended to')
+    args = parser.parse_args()
+
+    run_benchmarks(args.scales, args.seed, args.output)
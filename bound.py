@@ -0,0 +1,96 @@
+from free_runs import create_free_runs, fits_free_run
+from slot_grid import QUARTERS_PER_DAY
+from student_registry import find_family
+
+# Upper bound on the number of students a schedule can place, to know when a search cannot do any better.
+# Every lesson of at least k quarter-hours covers one quarter-hour whose number is a multiple of k, and no two
+# lessons of a teacher cover the same one. Matching each student to one of these quarter-hours it could cover, with
+# the teacher-days it could have, relaxes the schedule (breaks and siblings are ignored), so no schedule places more
+# students than the largest matching. Siblings can be placed next to one another outside their own times, so a
+# student with a family could start anywhere on its teacher-days.
+ANY_START = (1 << QUARTERS_PER_DAY) - 1
+
+
+def max_placeable_students(students, teachers_schedule, student_registry, placed=()):
+    students_cells, teacher_days = placement_cells(students, teachers_schedule, student_registry, placed)
+    return maximum_matching(list(students_cells.values()), len(teacher_days) * QUARTERS_PER_DAY)
+
+
+def placement_cells(students, teachers_schedule, student_registry, placed=()):
+    # The cells each student could cover, and the first cell of each teacher-day
+    teachers_free_runs = create_free_runs(teachers_schedule)
+    lessons = {index: int(lesson_duration) // 15
+               for index, want_lesson, lesson_duration in zip(students.index, students['want_lesson'],
+                                                              students['lesson_duration'])
+               if want_lesson and index not in placed and student_registry['feasible_teacher_days'].get(index)}
+    if not lessons:
+        return {}, {}
+    step = max(min(lessons.values()), 1)
+    quarters_covered = sum(1 << quarter for quarter in range(0, QUARTERS_PER_DAY, step))
+
+    # Cells are numbered by teacher-day then quarter-hour, the starts a lesson fits at are bitmasks like availability
+    teacher_days = {}
+    fitting_starts = {}
+    students_cells = {}
+    for index, nb_of_quarters in lessons.items():
+        masks = student_registry['availability'][index]['masks']
+        has_family = bool(find_family(student_registry, index))
+        covered_cells = []
+        for teacher_name, day in student_registry['feasible_teacher_days'][index]:
+            key = (teacher_name, day, nb_of_quarters)
+            if key not in fitting_starts:
+                day_runs = teachers_free_runs[teacher_name][day]
+                fitting_starts[key] = sum(1 << start for start in range(QUARTERS_PER_DAY)
+                                          if fits_free_run(day_runs, start, nb_of_quarters))
+            starts = (ANY_START if has_family else masks.get(day, 0)) & fitting_starts[key]
+            covered = 0
+            for offset in range(nb_of_quarters):
+                covered |= starts << offset
+            covered &= quarters_covered
+            if covered:
+                first_cell = teacher_days.setdefault((teacher_name, day), len(teacher_days) * QUARTERS_PER_DAY)
+                covered_cells.extend(first_cell + quarter for quarter in range(0, covered.bit_length(), step)
+                                     if covered >> quarter & 1)
+        if covered_cells:
+            students_cells[index] = covered_cells
+    return students_cells, teacher_days
+
+
+def maximum_matching(students_cells, nb_of_cells):
+    # Greedy matching first, then augmenting paths until a whole round finds none
+    cell_student = [None] * nb_of_cells
+    student_cell = [None] * len(students_cells)
+    for student, student_cells in enumerate(students_cells):
+        for cell in student_cells:
+            if cell_student[cell] is None:
+                cell_student[cell], student_cell[student] = student, cell
+                break
+
+    augmented = True
+    while augmented:
+        augmented = False
+        # Cells reached from a root without an augmenting path cannot lead to one from a later root either
+        visited = [False] * nb_of_cells
+        for root, root_cell in enumerate(student_cell):
+            if root_cell is None and augment(root, students_cells, cell_student, student_cell, visited):
+                augmented = True
+    return sum(1 for cell in student_cell if cell is not None)
+
+
+def augment(root, students_cells, cell_student, student_cell, visited):
+    reached_from = {}
+    queue = [root]
+    for student in queue:
+        for cell in students_cells[student]:
+            if visited[cell]:
+                continue
+            visited[cell] = True
+            reached_from[cell] = student
+            if cell_student[cell] is None:
+                # Each student along the path moves to the cell it was reached through
+                while cell is not None:
+                    student = reached_from[cell]
+                    cell_student[cell], student_cell[student], cell = student, cell, student_cell[student]
+                return True
+            queue.append(cell_student[cell])
+    return False
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from slot_grid import FREE, QUARTERS_PER_DAY, ceil_quarter
+
+# Each teacher-day keeps one window per break it must be able to take. A window remembers the free runs of
+# quarter-hours inside [start, end), so checking a lesson against it never rescans the teacher's day.
+
+
+def create_break_windows(teacher_index, teachers_schedule):
+    teachers_breaks = {}
+    for teacher in teacher_index['teachers']:
+        day_windows = teachers_breaks.setdefault(teacher['teacher_name'], {}).setdefault(teacher['day'], [])
+        day_schedule = teachers_schedule[teacher['teacher_name']][teacher['day']]
+        for break_number in (1, 2):
+            start = teacher[f'start_break_{break_number}']
+            end = teacher[f'end_break_{break_number}']
+            length = teacher[f'length_break_{break_number}']
+            if pd.isna(start) or pd.isna(end) or pd.isna(length):
+                continue
+            window = {'start': ceil_quarter(start), 'end': min(ceil_quarter(end), QUARTERS_PER_DAY),
+                      'needed': max(int(length) // 15, 1), 'runs': []}
+            update_break_window(window, day_schedule)
+            day_windows.append(window)
+    return teachers_breaks
+
+
+def update_break_windows(day_windows, day_schedule, start, end):
+    for window in day_windows:
+        if start < window['end'] and end > window['start']:
+            update_break_window(window, day_schedule)
+
+
+def update_break_window(window, day_schedule):
+    runs = []
+    run_start = None
+    for quarter in range(window['start'], window['end']):
+        if day_schedule[quarter] == FREE:
+            if run_start is None:
+                run_start = quarter
+        elif run_start is not None:
+            runs.append((run_start, quarter - run_start))
+            run_start = None
+    if run_start is not None:
+        runs.append((run_start, window['end'] - run_start))
+    window['runs'] = runs
+
+
+def break_still_possible(window, start, end):
+    # The lesson is only ever checked on free quarter-hours, so it sits inside a single free run of the window
+    lesson_start, lesson_end = max(start, window['start']), min(end, window['end'])
+    needed = window['needed']
+    for run_start, run_length in window['runs']:
+        run_end = run_start + run_length
+        if lesson_start < lesson_end and run_start <= lesson_start < run_end:
+            if lesson_start - run_start >= needed or run_end - lesson_end >= needed:
+                return True
+        elif run_length >= needed:
+            return True
+    return False
+
+
+def breaks_still_possible(day_windows, start, end):
+    for window in day_windows:
+        if not break_still_possible(window, start, end):
+            return False
+    return True
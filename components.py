@@ -0,0 +1,48 @@
+import pandas as pd
+
+# Students only compete for the teacher-days they could take a lesson with, so students and teacher-days split into
+# groups that never share anything: linked through a teacher-day one of them could have, a pinned lesson or a sibling.
+# Each group can be scheduled on its own.
+
+
+def connected_components(students, student_registry):
+    parents = {}
+
+    def find(node):
+        root = node
+        while parents.setdefault(root, root) != root:
+            root = parents[root]
+        while node != root:
+            parents[node], node = root, parents[node]
+        return root
+
+    def union(node, other_node):
+        parents[find(node)] = find(other_node)
+
+    for index, teacher_days in student_registry['feasible_teacher_days'].items():
+        for teacher_name, day in teacher_days:
+            union(('student', index), ('teacher_day', teacher_name, day))
+    for index, assigned_teacher, assigned_day in zip(students.index, students['assigned_teacher'],
+                                                     students['assigned_day']):
+        if not pd.isna(assigned_teacher) and not pd.isna(assigned_day):
+            union(('student', index), ('teacher_day', assigned_teacher, assigned_day))
+    for index, family in student_registry['family'].items():
+        for member in family:
+            union(('student', index), ('student', member))
+
+    # Components in the order of their first student, students without any teacher-day are left out
+    components = {}
+    for index in students.index:
+        if ('student', index) in parents:
+            components.setdefault(find(('student', index)), {'students': [], 'teacher_days': set()})
+    for node in parents:
+        component = components.get(find(node))
+        if component is None:
+            continue
+        if node[0] == 'student':
+            component['students'].append(node[1])
+        else:
+            component['teacher_days'].add(node[1:])
+    for component in components.values():
+        component['students'].sort()
+    return list(components.values())
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from students_cleanup import time_in_minutes
+
+# Before searching, every student is matched against every teacher-day at once: the teacher-days a student could
+# possibly take a lesson with, or the first reason none of them can. Students without any are never searched.
+REASONS = {'no_availability': 'Aucune plage horaire valide',
+           'unknown_preferred_teacher': "L'enseignant demandé n'enseigne pas cette session",
+           'instrument_not_taught': "Aucun enseignant n'accepte de nouvel élève pour cet instrument",
+           'preferred_teacher_not_on_days': "L'enseignant demandé ne travaille pas les jours choisis",
+           'no_teacher_on_days': 'Aucun enseignant de cet instrument les jours choisis',
+           'other_campus_only': "Les enseignants disponibles sont à l'autre école",
+           'outside_teacher_hours': 'Plages horaires en dehors des heures des enseignants'}
+
+
+def check_feasibility(students, teacher_index, availability):
+    student_days = pd.DataFrame([(index, day, mask) for index, student_availability in availability.items()
+                                 for day, mask in student_availability['masks'].items() if mask],
+                                columns=['student', 'day', 'mask'])
+    candidates = candidate_teacher_days(students, teacher_index)
+    on_days = candidates.merge(student_days, on=['student', 'day'])
+    at_location = on_days[on_days['student_location'].eq(on_days['location']) | on_days['can_be_realocated']]
+    # The lesson has to start at one of the student's quarter-hours and end before the teacher leaves
+    nb_of_starts = (at_location['last_start'] - at_location['first_start'] + 1).clip(lower=0).to_numpy(dtype=object)
+    teacher_starts = ((1 << nb_of_starts) - 1) << at_location['first_start'].to_numpy(dtype=object)
+    feasible = at_location[(at_location['mask'].to_numpy(dtype=object) & teacher_starts) != 0]
+
+    has_preferred_teacher = students['preferred_teacher'].notna() & students['preferred_teacher'].ne('')
+    reasons = pd.Series('', index=students.index, dtype=object)
+    # Each check only explains the students the previous ones did not
+    stages = [(student_days, 'no_availability', 'no_availability'),
+              (candidates, 'unknown_preferred_teacher', 'instrument_not_taught'),
+              (on_days, 'preferred_teacher_not_on_days', 'no_teacher_on_days'),
+              (at_location, 'other_campus_only', 'other_campus_only'),
+              (feasible, 'outside_teacher_hours', 'outside_teacher_hours')]
+    for rows, preferred_teacher_reason, reason in stages:
+        missing = ~students.index.isin(rows['student']) & reasons.eq('')
+        reasons[missing] = np.where(has_preferred_teacher[missing], preferred_teacher_reason, reason)
+
+    teacher_days = {}
+    for student_index, teacher_name, day in zip(feasible['student'], feasible['teacher_name'], feasible['day']):
+        teacher_days.setdefault(student_index, set()).add((teacher_name, day))
+    return {'feasible_teacher_days': teacher_days, 'infeasibility_reasons': reasons[reasons.ne('')].to_dict()}
+
+
+def candidate_teacher_days(students, teacher_index):
+    teachers = pd.DataFrame(teacher_index['teachers'], columns=['teacher_name', 'instrument', 'location', 'day',
+                                                                 'start_time', 'end_time', 'accept_new_student'])
+    teachers['first_start'] = -(-time_in_minutes(teachers['start_time']) // 15)
+    teachers['end'] = time_in_minutes(teachers['end_time']) // 15
+    teachers = teachers.dropna(subset=['first_start', 'end']).astype({'first_start': int, 'end': int})
+    student_columns = students[['instrument', 'preferred_teacher', 'location', 'can_be_realocated',
+                                'lesson_duration']].astype({'preferred_teacher': object})
+    student_columns = student_columns.rename(columns={'location': 'student_location',
+                                                      'instrument': 'student_instrument'})
+    student_columns['student'] = students.index
+    student_columns['nb_of_quarters'] = student_columns['lesson_duration'].astype(int) // 15
+    student_columns['can_be_realocated'] = student_columns['can_be_realocated'].astype(bool)
+
+    # Students asking for a teacher only go to that teacher, the others to the teachers of their instrument who
+    # accept new students, as possible_teachers does
+    has_preferred_teacher = students['preferred_teacher'].notna() & students['preferred_teacher'].ne('')
+    by_name = student_columns[has_preferred_teacher].merge(
+        teachers.drop(columns='instrument'), left_on='preferred_teacher', right_on='teacher_name')
+    accepting = teachers[teachers['accept_new_student'].astype(bool)]
+    instruments = accepting.assign(instrument=accepting['instrument'].astype(str).str.split(',')).explode('instrument')
+    instruments['instrument'] = instruments['instrument'].str.strip()
+    by_instrument = student_columns[~has_preferred_teacher].merge(instruments, left_on='student_instrument',
+                                                                  right_on='instrument')
+    candidates = pd.concat([by_name, by_instrument], ignore_index=True)
+    candidates['last_start'] = candidates['end'] - candidates['nb_of_quarters']
+    return candidates
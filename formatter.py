@@ -1,96 +1,108 @@
 import csv
-import re
-from datetime import timedelta, datetime
+import sys
 
+import pandas as pd
 
-def print_schedules(teachers, schedules):
-    with open('schedules_visual.txt', 'w', encoding='utf-8') as file:
-        print("\033[92m# Assigné au lieu et au professeur demandé\033[0m")
-        print("\033[96m# Assigné au professeur mais pas au lieu\033[0m")
-        print("\033[93m# Assigné au lieu mais pas au professeur\033[0m")
-        print("\033[91m# Assigné ni au professeur ni au lieu demandé\033[0m")
-        for teacher, schedule in schedules.items():
-            teacher_instrument = get_teacher_instrument(teachers, teacher)
-            teacher_schedule_title = f"\nHoraire de {teacher} ({teacher_instrument})"
-            print(teacher_schedule_title)
-            schedule_output = print_teacher_schedule(teacher, teachers, schedule)
-            print(schedule_output)  # Print to console
-            file.write("\n" + teacher_schedule_title + "\n")
-            file.write(re.sub(r'\033\[\d+m', '', schedule_output))  # Write to file without color codes
-
-
-def print_teacher_schedule(teacher, teachers, schedule):
-    availability_schedule = {}
-
-    for (day, time), entry in schedule.items():
-        # Update availability_schedule
-        if entry is not None:
-            availability_schedule[(day, time)] = (
-                entry['Name'], entry['preferred_teacher'], entry['preferred_location'])
-        else:
-            availability_schedule[(day, time)] = ("(Disponible)", None, None)
-
-    # Determine the start and end times
-    times = [time for day, time in schedule.keys()]
-    start_time = datetime.strptime(min(times), "%H:%M")
-    end_time = datetime.strptime(max(times), "%H:%M")
-
-    # Generate all 15-minute timeslots between start and end times
-    timeslots = []
-    current_time = start_time
-    while current_time <= end_time:
-        timeslots.append(current_time.strftime("%H:%M"))
-        current_time += timedelta(minutes=15)
-
-    # Prepare the day headers with instrument and location
-    days_of_the_week = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
-    teaching_days_header = []
-    for day in days_of_the_week:
-        teacher_row = get_teacher_by_day(teachers, teacher, day)
-        if not teacher_row.empty:
-            teaching_days_header.append(
-                f"{day.capitalize()} - {teacher_row['location'].iloc[0]}")
-
-    # Handle the case where the teacher is not teaching
-    if not teaching_days_header:
-        for day in days_of_the_week:
-            if any(d == day for d, _ in schedule.keys()):
-                teaching_days_header.append(f"{day.capitalize()}")
-
-    # Determine the column width based on the longest student name across the entire schedule
-    column_width = max(len(str(value[0])) for value in availability_schedule.values())
-    column_width = max(column_width, max(
-        len(day) for day in teaching_days_header))  # Make sure the width is not smaller than day names
-
-    output = []
-    # Print header
-    header = "Heure  | " + " | ".join(day.ljust(column_width) for day in teaching_days_header)
-    output.append(header)
-    output.append("-" * (9 + 4 * len(teaching_days_header) + column_width * len(teaching_days_header)))
+from slot_grid import FREE, OFF, quarter_to_time
 
-    # Print schedule
-    for time in timeslots:
-        row = []
-        for day_header in teaching_days_header:
-            day = day_header.split(' - ')[0].lower()
-            cell, preferred_teacher, preferred_location = availability_schedule.get((day.lower(), time),
-                                                                                    (" " * column_width, None, None))
-            cell = cell.center(column_width)
-            color_code = determine_cell_color(preferred_teacher, preferred_location)
-            formatted_cell = f"{color_code}{cell}\033[0m"
-            row.append(formatted_cell)
-        output.append(f"{time} | " + " | ".join(row))
 
-    return "\n".join(output)
+DAYS_OF_THE_WEEK = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+LEGEND = ["\033[92m# Assigné au lieu et au professeur demandé\033[0m",
+          "\033[96m# Assigné au professeur mais pas au lieu\033[0m",
+          "\033[93m# Assigné au lieu mais pas au professeur\033[0m",
+          "\033[91m# Assigné ni au professeur ni au lieu demandé\033[0m"]
+RESET_COLOR = "\033[0m"
 
 
-def get_teacher_by_day(teachers_schedule, teacher_name, day):
-    return teachers_schedule[(teachers_schedule['teacher_name'] == teacher_name) & (teachers_schedule['day'] == day)]
+def print_schedules(teachers, schedules, students, console=True):
+    teachers_days = group_teachers_by_day(teachers)
+    students_display = students_to_display(students)
+    # The console text is printed at once at the end, the file is written as each teacher's schedule is ready
+    console_output = list(LEGEND) if console else []
+    with open('schedules_visual.txt', 'w', encoding='utf-8', buffering=1 << 16) as file:
+        for teacher, schedule in schedules.items():
+            teacher_days = teachers_days.get(teacher, {'instrument': '', 'locations': {}})
+            teacher_schedule_title = f"\nHoraire de {teacher} ({teacher_days['instrument']})"
+            plain_output, colored_output = print_teacher_schedule(teacher, teacher_days['locations'], schedule,
+                                                                  students_display, console)
+            file.write("\n" + teacher_schedule_title + "\n")
+            file.write(plain_output)
+            if console:
+                console_output.append(teacher_schedule_title)
+                console_output.append(colored_output)
+    if console:
+        sys.stdout.write("\n".join(console_output) + "\n")
+
+
+def group_teachers_by_day(teachers):
+    # Teacher -> its first instrument and the location of each of its days, as the first matching row gives them
+    teachers_days = {}
+    for teacher_name, instrument, day, location in zip(teachers['teacher_name'], teachers['instrument'],
+                                                       teachers['day'], teachers['location']):
+        teacher_days = teachers_days.setdefault(teacher_name, {'instrument': instrument, 'locations': {}})
+        teacher_days['locations'].setdefault(day, location)
+    return teachers_days
+
+
+def students_to_display(students):
+    # Student index -> name, preferred teacher (None when any teacher is fine) and location
+    return {index: (str(student_name), None if pd.isna(preferred_teacher) else preferred_teacher, location)
+            for index, student_name, preferred_teacher, location in zip(
+                students.index, students['student_name'], students['preferred_teacher'], students['location'])}
+
+
+def print_teacher_schedule(teacher, teacher_locations, schedule, students_display, color=True):
+    # Cells by day then quarter-hour, as (text, preferred teacher, preferred location)
+    cells = {}
+    first_quarter, last_quarter = None, None
+    for day, day_schedule in schedule.items():
+        teacher_location = teacher_locations.get(day, '')
+        day_cells = cells.setdefault(day, {})
+        for quarter, entry in enumerate(day_schedule):
+            if entry == OFF:
+                continue
+            if entry == FREE:
+                day_cells[quarter] = ("(Disponible)", None, None)
+            else:
+                student_name, preferred_teacher, location = students_display[entry]
+                day_cells[quarter] = (student_name, preferred_teacher is None or preferred_teacher == teacher,
+                                      location == teacher_location)
+            first_quarter = quarter if first_quarter is None else min(first_quarter, quarter)
+            last_quarter = quarter if last_quarter is None else max(last_quarter, quarter)
+
+    if first_quarter is None:
+        return "", ""
+
+    # Prepare the day headers with location, or only the days of the schedule when the teacher is not teaching
+    teaching_days = [day for day in DAYS_OF_THE_WEEK if day in teacher_locations]
+    if teaching_days:
+        teaching_days_header = [f"{day.capitalize()} - {teacher_locations[day]}" for day in teaching_days]
+    else:
+        teaching_days = [day for day in DAYS_OF_THE_WEEK if day in schedule]
+        teaching_days_header = [day.capitalize() for day in teaching_days]
 
+    # Determine the column width based on the longest student name across the entire schedule
+    column_width = max(len(text) for day_cells in cells.values() for text, _, _ in day_cells.values())
+    column_width = max([column_width] + [len(day) for day in teaching_days_header])
 
-def get_teacher_instrument(teachers_schedule, teacher_name):
-    teacher_rows = teachers_schedule[(teachers_schedule['teacher_name'] == teacher_name)]
-    return teacher_rows['instrument'].iloc[0]
+    header = "Heure  | " + " | ".join(day.ljust(column_width) for day in teaching_days_header)
+    separator = "-" * (9 + 4 * len(teaching_days_header) + column_width * len(teaching_days_header))
+    plain_output, colored_output = [header, separator], [header, separator]
+    empty_cell = (" " * column_width, None, None)
+    for quarter in range(first_quarter, last_quarter + 1):
+        time = f"{quarter_to_time(quarter)} | "
+        plain_row, colored_row = [], []
+        for day in teaching_days:
+            text, preferred_teacher, preferred_location = cells.get(day, {}).get(quarter, empty_cell)
+            text = text.center(column_width)
+            plain_row.append(text)
+            if color:
+                colored_row.append(f"{determine_cell_color(preferred_teacher, preferred_location)}{text}{RESET_COLOR}")
+        plain_output.append(time + " | ".join(plain_row))
+        if color:
+            colored_output.append(time + " | ".join(colored_row))
+
+    return "\n".join(plain_output), "\n".join(colored_output) if color else ""
 
 
 def determine_cell_color(preferred_teacher, preferred_location):
@@ -118,11 +130,42 @@ def output_to_csv(students):
         writer.writerows(students)
 
 
-def print_stats(processed_students, teacher_schedules):
+def print_search_summary(result):
+    if result.nb_of_groups:
+        print(f'\nSearched {result.iterations} iteration(s) over {result.nb_of_groups} independent group(s) of '
+              f'students with {result.workers} worker(s) in {result.elapsed:.1f}s.')
+    else:
+        print(f'\nSearched {result.iterations} iteration(s) with {result.workers} worker(s) in {result.elapsed:.1f}s, '
+              f'best schedule found at iteration {result.iteration} after {result.time_to_best:.1f}s.')
+    exact_search = result.exact_search
+    if exact_search is None:
+        return
+    if exact_search.optimal:
+        outcome = 'the schedule is optimal'
+    else:
+        outcome = 'no better schedule exists' if exact_search.complete else 'time is up'
+        if exact_search.siblings_held:
+            outcome += ' with the siblings placed together held in place'
+    print(f'\nExact search explored {exact_search.nb_of_nodes} node(s) in {exact_search.elapsed:.1f}s, {outcome}, '
+          f'{exact_search.nb_of_added_students} more student(s) than the heuristic.')
+
+
+def print_stats(processed_students, teacher_schedules, upper_bound=None):
     nb_of_assigned_students = sum(1 for student in processed_students if student['Assigné'] is True)
     percent_of_assigned_students = round((nb_of_assigned_students / len(processed_students)) * 100, 1)
 
-    print(f'\nStudent matched at {percent_of_assigned_students}%.')
+    if upper_bound is None:
+        print(f'\nStudent matched at {percent_of_assigned_students}%.')
+    elif nb_of_assigned_students >= upper_bound:
+        print(f'\nStudent matched at {percent_of_assigned_students}%, no schedule can match more students.')
+    else:
+        percent_of_placeable_students = round((upper_bound / len(processed_students)) * 100, 1)
+        print(f'\nStudent matched at {percent_of_assigned_students}%, at most {percent_of_placeable_students}% '
+              f'can be matched ({upper_bound - nb_of_assigned_students} student(s) away from the upper bound).')
+    nb_of_impossible_students = sum(1 for student in processed_students if student.get('Raison'))
+    if nb_of_impossible_students:
+        print(f'{nb_of_impossible_students} student(s) cannot be placed with any teacher, '
+              f'the reason is in the Raison column of schedule.csv.')
 
 
 def calculate_teachers_assignment_percentage(teachers_schedule):
@@ -130,8 +173,9 @@ def calculate_teachers_assignment_percentage(teachers_schedule):
     total_teachers = len(teachers_schedule)
 
     for teacher, schedule in teachers_schedule.items():
-        total_timeslots = len(schedule)
-        timeslots_with_students = sum(1 for student_name in schedule.values() if student_name is not None)
+        total_timeslots = sum(len(day_schedule) - day_schedule.count(OFF) for day_schedule in schedule.values())
+        timeslots_with_students = sum(len(day_schedule) - day_schedule.count(FREE) - day_schedule.count(OFF)
+                                      for day_schedule in schedule.values())
         teacher_percentage = (timeslots_with_students / total_timeslots) * 100
         total_percentage += teacher_percentage
 
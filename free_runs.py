@@ -0,0 +1,63 @@
+from array import array
+from bisect import bisect_left
+
+from slot_grid import FREE, QUARTERS_PER_DAY
+
+# Each teacher-day keeps, for every quarter-hour, the length of the run it starts: the number of free quarter-hours
+# from there when it is free, minus the number of taken or off quarter-hours before the next free one otherwise.
+# Checking whether a lesson fits is a single lookup, and a search for the earliest fitting start jumps from run to run.
+
+
+def create_free_runs(teachers_schedule):
+    teachers_free_runs = {}
+    for teacher_name, teacher_schedule in teachers_schedule.items():
+        for day, day_schedule in teacher_schedule.items():
+            day_runs = array('i', [0]) * QUARTERS_PER_DAY
+            update_free_runs(day_runs, day_schedule, 0, QUARTERS_PER_DAY)
+            teachers_free_runs.setdefault(teacher_name, {})[day] = day_runs
+    return teachers_free_runs
+
+
+def update_free_runs(day_runs, day_schedule, start, end):
+    # Only the quarter-hours up to the end of the change are recomputed, going back until a run length stays the same
+    following = day_runs[end] if end < QUARTERS_PER_DAY else 0
+    for quarter in range(end - 1, -1, -1):
+        if day_schedule[quarter] == FREE:
+            run = following + 1 if following > 0 else 1
+        else:
+            run = following - 1 if following < 0 else -1
+        if quarter < start and day_runs[quarter] == run:
+            break
+        day_runs[quarter] = run
+        following = run
+
+
+def fits_free_run(day_runs, start, nb_of_quarters):
+    return 0 <= start < QUARTERS_PER_DAY and day_runs[start] >= nb_of_quarters
+
+
+def earliest_free_start(day_runs, first, last, nb_of_quarters):
+    # A start inside a free run too short for the lesson leaves an even shorter run, so the whole run is skipped
+    start = max(first, 0)
+    while start <= last and start < QUARTERS_PER_DAY:
+        run = day_runs[start]
+        if run >= nb_of_quarters:
+            return start
+        start += abs(run)
+    return None
+
+
+def free_starts(day_runs, timeslots, nb_of_quarters):
+    # The student's timeslots where the lesson fits, in the order given, ascending timeslots skip whole runs
+    if not timeslots or timeslots[0] > timeslots[-1]:
+        yield from (start for start in timeslots if fits_free_run(day_runs, start, nb_of_quarters))
+        return
+    position = 0
+    while position < len(timeslots):
+        start = earliest_free_start(day_runs, timeslots[position], timeslots[-1], nb_of_quarters)
+        if start is None:
+            return
+        position = bisect_left(timeslots, start, position)
+        if timeslots[position] == start:
+            yield start
+            position += 1
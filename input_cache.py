@@ -0,0 +1,80 @@
+import hashlib
+import os
+import pickle
+import sys
+import zlib
+
+# Parsed inputs are cached under a hash of the input files and of the code parsing them, so a cached problem is
+# only reused when rebuilding it would give the same result.
+CACHE_DIRECTORY = '.schedule_cache'
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+CODE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def cache_key(input_files, *options):
+    digest = hashlib.sha256()
+    update_digest(digest, sys.version.encode())
+    for file_name in sorted(os.listdir(CODE_DIRECTORY)):
+        if file_name.endswith('.py'):
+            update_digest(digest, file_name.encode())
+            update_digest(digest, read_bytes(os.path.join(CODE_DIRECTORY, file_name)))
+    for input_file in input_files:
+        # Missing inputs still move the hash, so the same file given as another input gets another key
+        if input_file is None:
+            digest.update(b'\0')
+        else:
+            digest.update(b'\1')
+            update_digest(digest, read_bytes(input_file))
+    update_digest(digest, repr(options).encode())
+    return digest.hexdigest()
+
+
+def update_digest(digest, data):
+    # Each part is prefixed with its length, so different inputs never hash the same sequence of bytes
+    digest.update(len(data).to_bytes(8, 'big'))
+    digest.update(data)
+
+
+def read_bytes(file_name):
+    with open(file_name, 'rb') as file:
+        return file.read()
+
+
+def cache_file(key, cache_directory=CACHE_DIRECTORY):
+    return os.path.join(cache_directory, f'{key}.pickle.z')
+
+
+def load_from_cache(key, cache_directory=CACHE_DIRECTORY):
+    path = cache_file(key, cache_directory)
+    try:
+        with open(path, 'rb') as file:
+            cached = pickle.loads(zlib.decompress(file.read()))
+        # Entries are evicted least recently used first
+        os.utime(path)
+    except Exception:
+        # Missing, truncated and outdated entries are rebuilt
+        return None
+    return cached
+
+
+def save_to_cache(key, cached, cache_directory=CACHE_DIRECTORY, max_cache_size=MAX_CACHE_SIZE):
+    os.makedirs(cache_directory, exist_ok=True)
+    path = cache_file(key, cache_directory)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(zlib.compress(pickle.dumps(cached, protocol=pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(temporary_path, path)
+    evict_cache_entries(cache_directory, max_cache_size)
+
+
+def evict_cache_entries(cache_directory=CACHE_DIRECTORY, max_cache_size=MAX_CACHE_SIZE):
+    entries = []
+    for entry in os.scandir(cache_directory):
+        if entry.is_file() and entry.name.endswith('.pickle.z'):
+            entries.append((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path))
+    # Keep the most recently used entries that fit, the newest entry is always kept
+    cache_size = 0
+    for position, (_, size, path) in enumerate(sorted(entries, reverse=True)):
+        cache_size += size
+        if position and cache_size > max_cache_size:
+            os.remove(path)
@@ -0,0 +1,114 @@
+import json
+import time
+from contextlib import contextmanager
+
+# Profiling replaces functions of the scheduling modules by wrappers recording their calls, so nothing is measured
+# and nothing is slowed down unless a profiler was started.
+TIMED_FUNCTIONS = ['pin_previous_assignments', 'build_teacher_index', 'build_student_registry', 'upper_bound',
+                   'split_problem', 'search', 'solve_components', 'sort_students', 'assign_students', 'process_family',
+                   'improve_schedule', 'print_schedules', 'print_stats', 'output_to_csv']
+COUNTED_FUNCTIONS = {'is_slot_available': 'is_slot_available', 'fits_free_run': 'fits_free_run',
+                     'free_starts': 'free_starts',
+                     'teacher_can_still_take_breaks': 'teacher_can_still_take_breaks',
+                     'possible_teachers': 'possible_teachers', 'place_student': 'local_search_placements'}
+
+
+def start_profiling(namespaces, stats_file=None):
+    profiler = {'namespaces': namespaces, 'originals': [], 'phases': {}, 'counters': {}, 'start': time.perf_counter(),
+                'stats_file': stats_file, 'cprofile': None}
+    for function_name in TIMED_FUNCTIONS:
+        wrap_function(profiler, function_name, timed_wrapper)
+    for function_name, counter_name in COUNTED_FUNCTIONS.items():
+        wrap_function(profiler, function_name, counted_wrapper, counter_name)
+    wrap_function(profiler, 'add_to_process_students', placement_wrapper, 'placements')
+    if stats_file:
+        import cProfile
+        profiler['cprofile'] = cProfile.Profile()
+        profiler['cprofile'].enable()
+    return profiler
+
+
+@contextmanager
+def timed_functions(namespaces, function_names):
+    # Only the given functions are timed, without counting the hot calls, for callers measuring a few phases
+    profiler = {'namespaces': namespaces, 'originals': [], 'phases': {}, 'counters': {}}
+    for function_name in function_names:
+        wrap_function(profiler, function_name, timed_wrapper)
+    try:
+        yield profiler['phases']
+    finally:
+        restore_functions(profiler)
+
+
+def wrap_function(profiler, function_name, wrapper, name=None):
+    for namespace in profiler['namespaces']:
+        function = namespace.get(function_name)
+        if function is not None:
+            profiler['originals'].append((namespace, function_name, function))
+            namespace[function_name] = wrapper(profiler, name or function_name, function)
+
+
+def timed_wrapper(profiler, phase_name, function):
+    def timed_function(*args, **kwargs):
+        with profile_phase(profiler, phase_name):
+            return function(*args, **kwargs)
+    return timed_function
+
+
+def counted_wrapper(profiler, counter_name, function):
+    counters = profiler['counters']
+    counters[counter_name] = 0
+
+    def counted_function(*args, **kwargs):
+        counters[counter_name] += 1
+        return function(*args, **kwargs)
+    return counted_function
+
+
+def placement_wrapper(profiler, counter_name, function):
+    counters = profiler['counters']
+    counters[counter_name] = 0
+
+    # Students are processed with an empty teacher name when they could not be placed
+    def counted_placement(processed_students, student, teacher_name='', *args, **kwargs):
+        if teacher_name:
+            counters[counter_name] += 1
+        return function(processed_students, student, teacher_name, *args, **kwargs)
+    return counted_placement
+
+
+@contextmanager
+def profile_phase(profiler, phase_name):
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase = profiler['phases'].setdefault(phase_name, {'calls': 0, 'seconds': 0.0})
+        phase['calls'] += 1
+        phase['seconds'] += time.perf_counter() - start
+
+
+def restore_functions(profiler):
+    for namespace, function_name, function in profiler['originals']:
+        namespace[function_name] = function
+
+
+def stop_profiling(profiler, output_file='profile.json', workers=1):
+    if profiler['cprofile'] is not None:
+        profiler['cprofile'].disable()
+        profiler['cprofile'].dump_stats(profiler['stats_file'])
+    restore_functions(profiler)
+
+    report = {'total_seconds': round(time.perf_counter() - profiler['start'], 4),
+              'phases': {name: {'calls': phase['calls'], 'seconds': round(phase['seconds'], 4)}
+                         for name, phase in profiler['phases'].items()},
+              'counters': dict(profiler['counters']), 'workers': workers}
+    if workers > 1:
+        # The search workers run in their own processes, their calls are not counted
+        report['note'] = 'counters and search phases only cover the main process'
+    with open(output_file, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    return report
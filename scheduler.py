@@ -0,0 +1,973 @@
+import random
+import time
+from collections import namedtuple
+
+import pandas as pd
+from teacher_index import build_teacher_index, shuffle_teacher_index, teacher_location, teachers_for_instrument, \
+    teachers_named, teaches_instrument
+from availability import available_starts, can_start_at, compile_student_availability, is_ideal_start
+from bound import max_placeable_students, maximum_matching, placement_cells
+from components import connected_components
+from breaks import create_break_windows, update_break_windows, breaks_still_possible
+from free_runs import create_free_runs, update_free_runs, fits_free_run, free_starts
+from feasibility import REASONS
+from student_registry import build_student_records, build_student_registry, feasible_teachers, find_availability, \
+    find_family, find_record, infeasibility_reason, normalize_name, pinned_students, registry_subset
+from slot_grid import FREE, OFF, QUARTERS_PER_DAY, new_day_schedule, floor_quarter, ceil_quarter, quarter_to_time
+
+# Compact record of what happened to a student, cheap to send back from a search worker
+Assignment = namedtuple('Assignment', ['student', 'teacher', 'day', 'start', 'nb_of_quarters', 'with_siblings'])
+# What the exact search found over all groups: the time is the exact phase's alone, after the heuristic search
+ExactSearch = namedtuple('ExactSearch', ['nb_of_nodes', 'elapsed', 'complete', 'optimal', 'siblings_held',
+                                         'nb_of_added_students'])
+# Set in search worker processes, so the others can stop once one of them places as many students as possible
+solved_event = None
+
+
+def search(students, teacher_index, student_registry, duration=0, seed=None, workers=1, upper_bound=None):
+    start = time.perf_counter()
+    deadline = time.time() + (duration or 0)
+    rng = random.Random(seed)
+    worker_seeds = [rng.randrange(2 ** 32) for _ in range(max(workers, 1))]
+
+    if workers > 1:
+        # Only parallel searches pay for importing the process pool
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # The first worker reaching the upper bound stops the others
+        solved = multiprocessing.Event()
+        with ProcessPoolExecutor(max_workers=workers, initializer=share_solved_event, initargs=(solved,)) as executor:
+            futures = [executor.submit(search_iterations, students, teacher_index, student_registry, deadline,
+                                       worker_seed, worker == 0, upper_bound)
+                       for worker, worker_seed in enumerate(worker_seeds)]
+            results = [future.result() for future in futures]
+    else:
+        results = [search_iterations(students, teacher_index, student_registry, deadline, worker_seeds[0],
+                                     upper_bound=upper_bound)]
+
+    return dict(merge_best_iterations(results), workers=len(results), elapsed=time.perf_counter() - start)
+
+
+def search_iterations(students, teacher_index, student_registry, deadline, seed=None, plain_first_iteration=True,
+                      upper_bound=None):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    best = new_best_iteration()
+    iteration = 0
+    target = len(students) if upper_bound is None else upper_bound
+
+    while True:
+        # The first iteration is the plain greedy pass, the following ones perturb the orderings
+        teachers_schedule, processed_students = assign_students(
+            teacher_index, student_registry, None if plain_first_iteration and not iteration else rng)
+        improve_schedule(teacher_index, student_registry, teachers_schedule, processed_students)
+        iteration += 1
+        update_best_iteration(best, processed_students, iteration, time.perf_counter() - start)
+        if best['nb_of_assigned_students'] >= target:
+            if solved_event is not None:
+                solved_event.set()
+            break
+        if time.time() >= deadline or (solved_event is not None and solved_event.is_set()):
+            break
+
+    best['iterations'] = iteration
+    return best
+
+
+def exact_search(students, teacher_index, student_registry, incumbent, duration=0, upper_bound=None):
+    # Branch and bound over the students the incumbent could move: pinned lessons and siblings placed together stay
+    # where they are, every other student takes one of its placements or none. A branch is cut when the students
+    # still to decide cannot beat the incumbent, first by counting them then by the matching bound of bound.py.
+    # Exploring every branch only proves the schedule optimal when no siblings were held in place, reaching the upper
+    # bound always does.
+    deadline = time.time() + (duration or 0)
+    forced_students = pinned_students(student_registry)
+    fixed_assignments = [assignment for assignment in incumbent['processed_students']
+                         if assignment.student in forced_students or assignment.with_siblings]
+    fixed_students = {assignment.student for assignment in fixed_assignments}
+    movable_students = students.loc[[assignment.student for assignment in incumbent['processed_students']
+                                     if assignment.student not in fixed_students]]
+    students_cells, teacher_days = placement_cells(movable_students, rebuild_schedule(fixed_assignments,
+                                                                                      teacher_index),
+                                                   student_registry)
+    # Lessons the matching does not know of are kept too, the cells of the others only leave them out
+    fixed_assignments += [assignment for assignment in incumbent['processed_students']
+                          if assignment.teacher and assignment.student not in fixed_students
+                          and assignment.student not in students_cells]
+    teachers_schedule = rebuild_schedule(fixed_assignments, teacher_index)
+    teachers_breaks = create_break_windows(teacher_index, teachers_schedule)
+    teachers_free_runs = create_free_runs(teachers_schedule)
+    nb_of_fixed_students = sum(1 for assignment in fixed_assignments if assignment.teacher)
+
+    incumbent_placements = {assignment.student: (assignment.teacher, assignment.day, assignment.start)
+                            for assignment in incumbent['processed_students'] if assignment.teacher}
+    candidates = {}
+    placements = {}
+    for student_index in students_cells:
+        student_placements = candidate_placements(student_index, teacher_index, student_registry, candidates)
+        # The incumbent's placement is tried first, so the first dive rebuilds the incumbent
+        placements[student_index] = sorted(student_placements, key=lambda placement: (
+            placement[0]['teacher_name'], placement[0]['day'], placement[1]) != incumbent_placements.get(student_index))
+    order = sorted(students_cells, key=lambda student_index: len(placements[student_index]))
+    nb_of_quarters = {student_index: find_record(student_registry, student_index).nb_of_quarters
+                      for student_index in order}
+
+    taken_cells = [0] * (len(teacher_days) * QUARTERS_PER_DAY)
+    nb_of_cells = len(taken_cells)
+    chosen = []
+    best = {'placements': None, 'nb_of_assigned_students': incumbent['nb_of_assigned_students']}
+    target = len(students) if upper_bound is None else upper_bound
+
+    def branches(depth):
+        student_index = order[depth]
+        for teacher, start in placements[student_index]:
+            if placement_fits(teacher, start, nb_of_quarters[student_index], teachers_free_runs, teachers_breaks):
+                yield teacher, start
+        yield None
+
+    def apply(student_index, choice, taken):
+        if choice is None:
+            return
+        teacher, start = choice
+        teacher_name = teacher['teacher_name']
+        assign_student_to_slot(teachers_schedule[teacher_name], teacher['day'], start,
+                               nb_of_quarters[student_index], student_index if taken else FREE,
+                               teachers_breaks[teacher_name], teachers_free_runs[teacher_name])
+        first_cell = teacher_days.get((teacher_name, teacher['day']))
+        if first_cell is not None:
+            for cell in range(first_cell + start, first_cell + start + nb_of_quarters[student_index]):
+                taken_cells[cell] += 1 if taken else -1
+
+    def cannot_improve(depth, nb_of_placed_students):
+        nb_of_assigned_students = nb_of_fixed_students + nb_of_placed_students
+        if nb_of_assigned_students + len(order) - depth <= best['nb_of_assigned_students']:
+            return True
+        remaining_cells = [[cell for cell in students_cells[student_index] if not taken_cells[cell]]
+                           for student_index in order[depth:]]
+        return (nb_of_assigned_students + maximum_matching(remaining_cells, nb_of_cells)
+                <= best['nb_of_assigned_students'])
+
+    nb_of_nodes, nb_of_placed_students, timed_out = 0, 0, False
+    stack = [] if not order or cannot_improve(0, 0) else [branches(0)]
+    while stack and best['nb_of_assigned_students'] < target:
+        nb_of_nodes += 1
+        if nb_of_nodes % 256 == 0 and time.time() >= deadline:
+            timed_out = True
+            break
+        choice = next(stack[-1], False)
+        if choice is False:
+            stack.pop()
+            if chosen:
+                apply(order[len(chosen) - 1], chosen[-1], False)
+                nb_of_placed_students -= chosen.pop() is not None
+            continue
+        apply(order[len(chosen)], choice, True)
+        chosen.append(choice)
+        nb_of_placed_students += choice is not None
+        if len(chosen) == len(order):
+            if nb_of_fixed_students + nb_of_placed_students > best['nb_of_assigned_students']:
+                best.update(placements=list(chosen),
+                            nb_of_assigned_students=nb_of_fixed_students + nb_of_placed_students)
+        elif not cannot_improve(len(chosen), nb_of_placed_students):
+            stack.append(branches(len(chosen)))
+            continue
+        apply(order[len(chosen) - 1], chosen[-1], False)
+        nb_of_placed_students -= chosen.pop() is not None
+
+    siblings_held = any(assignment.student not in forced_students for assignment in fixed_assignments)
+    exact = dict(incumbent, nb_of_nodes=nb_of_nodes, complete=not timed_out, siblings_held=siblings_held,
+                 optimal=best['nb_of_assigned_students'] >= target or not (timed_out or siblings_held))
+    if best['placements'] is None:
+        return exact
+
+    exact_assignments = {student_index: Assignment(student_index, '', '', None, 0, False)
+                         for student_index in order}
+    for student_index, choice in zip(order, best['placements']):
+        if choice is not None:
+            teacher, start = choice
+            exact_assignments[student_index] = Assignment(student_index, teacher['teacher_name'], teacher['day'],
+                                                          start, nb_of_quarters[student_index], False)
+    exact['processed_students'] = [exact_assignments.get(assignment.student, assignment)
+                                   for assignment in incumbent['processed_students']]
+    exact['nb_of_assigned_students'] = best['nb_of_assigned_students']
+    return exact
+
+
+def summarize_exact_search(results):
+    nb_of_heuristic_students = sum(result['nb_of_heuristic_students'] for result in results)
+    return ExactSearch(sum(result['nb_of_nodes'] for result in results),
+                       sum(result['exact_elapsed'] for result in results),
+                       all(result['complete'] for result in results), all(result['optimal'] for result in results),
+                       any(result['siblings_held'] for result in results),
+                       sum(result['nb_of_assigned_students'] for result in results) - nb_of_heuristic_students)
+
+
+def share_solved_event(event):
+    global solved_event
+    solved_event = event
+
+
+def assign_students(teacher_index, student_registry, rng=None):
+    teachers_schedule = create_schedule(teacher_index)
+    teachers_breaks = create_break_windows(teacher_index, teachers_schedule)
+    teachers_free_runs = create_free_runs(teachers_schedule)
+    prioritized_students = sort_students(student_registry, rng)
+    # Processed students by index, in the order they were processed
+    processed_students = {}
+    if rng is not None:
+        teacher_index = shuffle_teacher_index(teacher_index, rng)
+
+    for student_index in prioritized_students:
+        student = find_record(student_registry, student_index)
+        if is_student_processed(processed_students, student):
+            continue
+
+        if student.pinned:
+            force_student_assignment(student, teachers_schedule, teachers_breaks, teachers_free_runs,
+                                     processed_students)
+            continue
+
+        if not student.want_lesson or infeasibility_reason(student_registry, student.index):
+            add_to_process_students(processed_students, student)
+            continue
+
+        family = family_to_place(student, student_registry, processed_students)
+        if len(family) > 1 and process_family(family, teachers_schedule, teachers_breaks, teachers_free_runs,
+                                              processed_students, teacher_index, student_registry, rng):
+            continue
+
+        process_single_student(student, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students,
+                               teacher_index, student_registry, rng)
+
+    return teachers_schedule, processed_students
+
+
+def improve_schedule(teacher_index, student_registry, teachers_schedule, processed_students):
+    # Local search after the greedy pass: place each unassigned student, if needed by first relocating the students
+    # in the way (which may in turn push another student out). Moves are scored by how many students they add.
+    teachers_breaks = create_break_windows(teacher_index, teachers_schedule)
+    teachers_free_runs = create_free_runs(teachers_schedule)
+    forced_students = pinned_students(student_registry)
+    candidates = {}
+    nb_of_added_students = 0
+    improved = True
+    while improved:
+        improved = False
+        for assignment in list(processed_students.values()):
+            if (assignment.teacher or not find_record(student_registry, assignment.student).want_lesson
+                    or infeasibility_reason(student_registry, assignment.student)):
+                continue
+            if insert_with_ejection_chain(assignment.student, teacher_index, student_registry,
+                                          teachers_schedule, teachers_breaks, teachers_free_runs, processed_students,
+                                          forced_students, candidates):
+                nb_of_added_students += 1
+                improved = True
+    return nb_of_added_students
+
+
+def insert_with_ejection_chain(student_index, teacher_index, student_registry, teachers_schedule, teachers_breaks,
+                               teachers_free_runs, processed_students, forced_students, candidates):
+    nb_of_quarters = find_record(student_registry, student_index).nb_of_quarters
+    placements = candidate_placements(student_index, teacher_index, student_registry, candidates)
+    for teacher, start in placements:
+        if placement_fits(teacher, start, nb_of_quarters, teachers_free_runs, teachers_breaks):
+            place_student(student_index, teacher, start, nb_of_quarters, teachers_schedule, teachers_breaks,
+                          teachers_free_runs, processed_students)
+            return True
+
+    for teacher, start in placements:
+        blocking_students = students_in_the_way(teacher, start, nb_of_quarters, teachers_schedule)
+        if blocking_students is None or not all(is_movable(processed_students[blocking_student], forced_students)
+                                                for blocking_student in blocking_students):
+            continue
+        previous_assignments = [processed_students[blocking_student] for blocking_student in blocking_students]
+        for previous_assignment in previous_assignments:
+            remove_student(previous_assignment, teachers_schedule, teachers_breaks, teachers_free_runs,
+                           processed_students)
+        if placement_fits(teacher, start, nb_of_quarters, teachers_free_runs, teachers_breaks):
+            place_student(student_index, teacher, start, nb_of_quarters, teachers_schedule, teachers_breaks,
+                          teachers_free_runs, processed_students)
+            moves = []
+            if all(relocate_student(previous_assignment, teacher_index, student_registry, teachers_schedule,
+                                    teachers_breaks, teachers_free_runs, processed_students, forced_students,
+                                    candidates, moves)
+                   for previous_assignment in previous_assignments):
+                return True
+            undo_moves(moves, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students)
+            remove_student(processed_students[student_index], teachers_schedule, teachers_breaks, teachers_free_runs,
+                           processed_students)
+        for previous_assignment in previous_assignments:
+            restore_assignment(previous_assignment, teachers_schedule, teachers_breaks, teachers_free_runs,
+                               processed_students)
+    return False
+
+
+def relocate_student(previous_assignment, teacher_index, student_registry, teachers_schedule, teachers_breaks,
+                     teachers_free_runs, processed_students, forced_students, candidates, moves, swap=True):
+    # Move an unplaced student to a free slot, or take the slot of another student who can move to a free slot
+    student_index, nb_of_quarters = previous_assignment.student, previous_assignment.nb_of_quarters
+    placements = candidate_placements(student_index, teacher_index, student_registry, candidates)
+    for teacher, start in placements:
+        if placement_fits(teacher, start, nb_of_quarters, teachers_free_runs, teachers_breaks):
+            place_student(student_index, teacher, start, nb_of_quarters, teachers_schedule, teachers_breaks,
+                          teachers_free_runs, processed_students, previous_assignment.with_siblings)
+            moves.append((None, processed_students[student_index]))
+            return True
+    if not swap:
+        return False
+
+    for teacher, start in placements:
+        blocking_students = students_in_the_way(teacher, start, nb_of_quarters, teachers_schedule)
+        if not blocking_students or len(blocking_students) > 1:
+            continue
+        other_assignment = processed_students[blocking_students.pop()]
+        if not is_movable(other_assignment, forced_students):
+            continue
+        remove_student(other_assignment, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students)
+        if placement_fits(teacher, start, nb_of_quarters, teachers_free_runs, teachers_breaks):
+            place_student(student_index, teacher, start, nb_of_quarters, teachers_schedule, teachers_breaks,
+                          teachers_free_runs, processed_students, previous_assignment.with_siblings)
+            other_moves = []
+            if relocate_student(other_assignment, teacher_index, student_registry, teachers_schedule,
+                                teachers_breaks, teachers_free_runs, processed_students, forced_students,
+                                candidates, other_moves, swap=False):
+                moves.append((other_assignment, None))
+                moves.append((None, processed_students[student_index]))
+                moves.extend(other_moves)
+                return True
+            remove_student(processed_students[student_index], teachers_schedule, teachers_breaks, teachers_free_runs,
+                           processed_students)
+        restore_assignment(other_assignment, teachers_schedule, teachers_breaks, teachers_free_runs,
+                           processed_students)
+    return False
+
+
+def undo_moves(moves, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students):
+    for previous_assignment, new_assignment in reversed(moves):
+        if new_assignment is not None:
+            remove_student(new_assignment, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students)
+        if previous_assignment is not None:
+            restore_assignment(previous_assignment, teachers_schedule, teachers_breaks, teachers_free_runs,
+                               processed_students)
+
+
+def candidate_placements(student_index, teacher_index, student_registry, candidates):
+    if student_index not in candidates:
+        student = find_record(student_registry, student_index)
+        student_schedule = available_starts(find_availability(student_registry, student_index))
+        candidates[student_index] = [
+            (teacher, start) for teacher in feasible_teachers(student_registry, student_index,
+                                                             possible_teachers(student, teacher_index))
+            if student_and_teacher_are_at_same_location(student, teacher)
+            for start in student_schedule.get(teacher['day'], [])]
+    return candidates[student_index]
+
+
+def placement_fits(teacher, start, nb_of_quarters, teachers_free_runs, teachers_breaks):
+    return (fits_free_run(teachers_free_runs[teacher['teacher_name']][teacher['day']], start, nb_of_quarters)
+            and teacher_can_still_take_breaks(teachers_breaks[teacher['teacher_name']], teacher, start,
+                                              nb_of_quarters))
+
+
+def feasible_placements(student, teacher_index, teachers_free_runs, teachers_breaks):
+    # Every teacher-day and start where the student could take a lesson without moving anyone
+    record = next(iter(build_student_records(pd.DataFrame([student])).values()))
+    student_schedule = available_starts(compile_student_availability(student))
+    return [(teacher, start) for teacher in possible_teachers(record, teacher_index)
+            if student_and_teacher_are_at_same_location(record, teacher)
+            for start in free_starts(teachers_free_runs[teacher['teacher_name']][teacher['day']],
+                                     student_schedule.get(teacher['day'], []), record.nb_of_quarters)
+            if teacher_can_still_take_breaks(teachers_breaks[teacher['teacher_name']], teacher, start,
+                                             record.nb_of_quarters)]
+
+
+def students_in_the_way(teacher, start, nb_of_quarters, teachers_schedule):
+    day_schedule = teachers_schedule[teacher['teacher_name']][teacher['day']]
+    if start < 0 or start + nb_of_quarters > QUARTERS_PER_DAY:
+        return None
+    occupants = set(day_schedule[start:start + nb_of_quarters])
+    if OFF in occupants:
+        return None
+    occupants.discard(FREE)
+    return occupants
+
+
+def is_movable(assignment, forced_students):
+    return assignment.student not in forced_students and not assignment.with_siblings
+
+
+def place_student(student_index, teacher, start, nb_of_quarters, teachers_schedule, teachers_breaks,
+                  teachers_free_runs, processed_students, with_siblings=False):
+    teacher_name = teacher['teacher_name']
+    assign_student_to_slot(teachers_schedule[teacher_name], teacher['day'], start, nb_of_quarters, student_index,
+                           teachers_breaks[teacher_name], teachers_free_runs[teacher_name])
+    processed_students[student_index] = Assignment(student_index, teacher_name, teacher['day'], start,
+                                                   nb_of_quarters, with_siblings)
+
+
+def remove_student(assignment, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students):
+    unassign_student_from_slot(teachers_schedule[assignment.teacher], assignment.day, assignment.start,
+                               assignment.nb_of_quarters, teachers_breaks[assignment.teacher],
+                               teachers_free_runs[assignment.teacher])
+    processed_students[assignment.student] = assignment._replace(teacher='', day='', start=None, nb_of_quarters=0,
+                                                                 with_siblings=False)
+
+
+def restore_assignment(assignment, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students):
+    assign_student_to_slot(teachers_schedule[assignment.teacher], assignment.day, assignment.start,
+                           assignment.nb_of_quarters, assignment.student, teachers_breaks[assignment.teacher],
+                           teachers_free_runs[assignment.teacher])
+    processed_students[assignment.student] = assignment
+
+
+def force_student_assignment(student, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students):
+    teacher_name, day, start, nb_of_quarters, with_siblings = student.pinned
+    teacher_schedule = teachers_schedule.setdefault(teacher_name, {})
+    teacher_schedule.setdefault(day, new_day_schedule())
+    assign_student_to_slot(teacher_schedule, day, start, nb_of_quarters, student.index,
+                           teachers_breaks.get(teacher_name), teachers_free_runs.get(teacher_name))
+    add_to_process_students(processed_students, student, teacher_name, day, start, nb_of_quarters, with_siblings)
+
+
+def get_teacher_location_on_specific_day(teacher_name, day, teacher_index):
+    return teacher_location(teacher_index, teacher_name, day)
+
+
+def need_to_force_student_assignment(student):
+    return (not pd.isna(student['assigned_teacher']) and not pd.isna(student['assigned_day'])
+            and not pd.isna(student['assigned_start_time']) and not pd.isna(student['assigned_duration']))
+
+
+def pin_previous_assignments(students, previous_schedule, teacher_index):
+    # Keep every lesson of the previous schedule that still fits the new inputs by forcing it like a manual
+    # assignment, so only new, changed and unassigned students are left to the search
+    students = students.copy()
+    assigned_columns = ['assigned_teacher', 'assigned_day', 'assigned_start_time', 'assigned_duration']
+    students[assigned_columns] = students[assigned_columns].astype(object)
+    previous_assignments = {}
+    for _, previous in previous_schedule[previous_schedule['Assigné'] == True].iterrows():
+        previous_assignments.setdefault((normalize_name(previous['Nom Étudiant']),
+                                         normalize_name(previous['Instrument'])), previous)
+
+    teachers_schedule = create_schedule(teacher_index)
+    forced_students = students.apply(need_to_force_student_assignment, axis=1)
+    for index, student in students[forced_students].iterrows():
+        start, nb_of_quarters = create_time_slot_for_duration(student['assigned_start_time'],
+                                                              student['assigned_duration'])
+        teacher_schedule = teachers_schedule.setdefault(student['assigned_teacher'], {})
+        teacher_schedule.setdefault(student['assigned_day'], new_day_schedule())
+        assign_student_to_slot(teacher_schedule, student['assigned_day'], start, nb_of_quarters, index)
+
+    nb_of_pinned_students = 0
+    for index, student in students[~forced_students & students['want_lesson']].iterrows():
+        previous = previous_assignments.pop((normalize_name(student['student_name']),
+                                             normalize_name(student['instrument'])), None)
+        if previous is None or not previous_assignment_still_fits(student, previous, teachers_schedule,
+                                                                  teacher_index):
+            continue
+        start, nb_of_quarters = create_time_slot_for_duration(previous['Heure'], previous['Durée'])
+        assign_student_to_slot(teachers_schedule[previous['Enseignant']], previous['Jour'], start, nb_of_quarters,
+                               index)
+        students.loc[index, assigned_columns] = [previous['Enseignant'], previous['Jour'], previous['Heure'],
+                                                 previous['Durée']]
+        nb_of_pinned_students += 1
+
+    return students, nb_of_pinned_students
+
+
+def previous_assignment_still_fits(student, previous, teachers_schedule, teacher_index):
+    teacher_name, day = previous['Enseignant'], previous['Jour']
+    start, nb_of_quarters = create_time_slot_for_duration(previous['Heure'], previous['Durée'])
+    if int(previous['Durée']) != int(student['lesson_duration']):
+        return False
+    if has_preferred_teacher(student) and student['preferred_teacher'] != teacher_name:
+        return False
+    if not teaches_instrument(teacher_index, teacher_name, day, student['instrument']):
+        return False
+    if (student['location'] != get_teacher_location_on_specific_day(teacher_name, day, teacher_index)
+            and not student['can_be_realocated']):
+        return False
+    # Lessons placed next to a sibling follow the sibling's times, only the day has to still be available
+    student_schedule = available_starts(compile_student_availability(student))
+    if day not in student_schedule or (start not in student_schedule[day]
+                                       and not previous['Assigné en même temps que la fraterie']):
+        return False
+    return is_slot_available(teachers_schedule.get(teacher_name, {}), day, start, nb_of_quarters)
+
+
+def possible_teachers(student, teacher_index):
+    # Checking if the student has a preferred teacher
+    if student.preferred_teacher is not None:
+        return teachers_named(teacher_index, student.preferred_teacher)
+    # Otherwise the teachers teaching the same instrument and accepting new students
+    return teachers_for_instrument(teacher_index, student.instrument)
+
+
+def has_preferred_teacher(student):
+    preferred_teacher = student.get('preferred_teacher')
+    return not pd.isna(preferred_teacher) and preferred_teacher != ''
+
+
+def sort_students(student_registry, rng=None):
+    priorities = student_registry['priorities']
+    student_indices = list(priorities)
+    if rng is not None:
+        # Shuffle beforehand so students sharing the same priority come out in a random order
+        rng.shuffle(student_indices)
+    return sorted(student_indices, key=priorities.__getitem__)
+
+
+# Helper function to check if the student has been processed
+def is_student_processed(processed_students, student):
+    return student.index in processed_students
+
+
+def process_single_student(student, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students,
+                           teacher_index, student_registry, rng=None):
+    student_schedule = available_starts(find_availability(student_registry, student.index), rng)
+    for teacher in feasible_teachers(student_registry, student.index, possible_teachers(student, teacher_index)):
+        teacher_schedule = teachers_schedule[teacher['teacher_name']]
+        teacher_breaks = teachers_breaks[teacher['teacher_name']]
+        teacher_free_runs = teachers_free_runs[teacher['teacher_name']]
+        if student_and_teacher_are_at_same_location(student, teacher):
+            if assign_to_available_slot(teacher_schedule, teacher_breaks, teacher_free_runs, student_schedule,
+                                        student.nb_of_quarters, student, teacher, processed_students):
+                break
+    else:
+        add_to_process_students(processed_students, student)
+
+
+def family_to_place(student, student_registry, processed_students):
+    # The student first, then the rest of the family still waiting for a lesson
+    return [student] + [find_record(student_registry, member) for member in find_family(student_registry, student.index)
+                        if member != student.index and member not in processed_students
+                        and find_record(student_registry, member).want_lesson
+                        and not infeasibility_reason(student_registry, member)]
+
+
+def process_family(family, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students,
+                   teacher_index, student_registry, rng=None):
+    # Each member's teachers at the right location are looked up once for the whole search
+    members = [family_member(member, teacher_index, student_registry, rng if position == 0 else None)
+               for position, member in enumerate(family)]
+    # The whole family together first, then fewer members, the members left out are placed on their own later
+    for nb_of_members in range(len(members), 1, -1):
+        if place_family(members[:nb_of_members], teachers_schedule, teachers_breaks, teachers_free_runs,
+                        processed_students):
+            return True
+    return False
+
+
+def family_member(student, teacher_index, student_registry, rng=None):
+    student_availability = find_availability(student_registry, student.index)
+    student_schedule = available_starts(student_availability, rng)
+    teachers = {}
+    for teacher in feasible_teachers(student_registry, student.index, possible_teachers(student, teacher_index)):
+        if teacher['day'] in student_schedule and student_and_teacher_are_at_same_location(student, teacher):
+            teachers.setdefault(teacher['day'], []).append(teacher)
+    return {'student': student, 'nb_of_quarters': student.nb_of_quarters,
+            'schedule': student_schedule, 'availability': student_availability, 'teachers': teachers}
+
+
+def place_family(members, teachers_schedule, teachers_breaks, teachers_free_runs, processed_students):
+    lead = members[0]
+    for day, timeslots in lead['schedule'].items():
+        # The family arrives for the first lesson, so it starts when every member is available and has a teacher
+        if not all(member['teachers'].get(day) for member in members):
+            continue
+        for timeslot in timeslots:
+            if not all(can_start_at(member['availability'], day, timeslot) for member in members):
+                continue
+            for teacher in lead['teachers'][day]:
+                placements = []
+                if try_family_placement(lead, teacher, day, timeslot, placements, teachers_schedule, teachers_breaks,
+                                        teachers_free_runs):
+                    if place_family_members(members, day, placements, teachers_schedule, teachers_breaks,
+                                            teachers_free_runs):
+                        for member, member_teacher, start in placements:
+                            add_to_process_students(processed_students, member['student'],
+                                                    member_teacher['teacher_name'], day, start,
+                                                    member['nb_of_quarters'], True)
+                        return True
+                    undo_family_placement(placements, teachers_schedule, teachers_breaks, teachers_free_runs)
+    return False
+
+
+def place_family_members(members, day, placements, teachers_schedule, teachers_breaks, teachers_free_runs):
+    if len(placements) == len(members):
+        return True
+    member = members[len(placements)]
+    for teacher, start in family_member_starts(member, day, placements):
+        if try_family_placement(member, teacher, day, start, placements, teachers_schedule, teachers_breaks,
+                                teachers_free_runs):
+            if place_family_members(members, day, placements, teachers_schedule, teachers_breaks,
+                                    teachers_free_runs):
+                return True
+            undo_family_placement([placements.pop()], teachers_schedule, teachers_breaks, teachers_free_runs)
+    return False
+
+
+def family_member_starts(member, day, placements):
+    # Right after the family's last lesson with the same teacher, or with another teacher within 15 minutes of the
+    # first member's lesson
+    lesson_ends = {}
+    for placed_member, teacher, start in placements:
+        lesson_ends[teacher['teacher_name']] = max(lesson_ends.get(teacher['teacher_name'], 0),
+                                                   start + placed_member['nb_of_quarters'])
+    for teacher in member['teachers'][day]:
+        if teacher['teacher_name'] in lesson_ends:
+            yield teacher, lesson_ends[teacher['teacher_name']]
+    first_start = placements[0][2]
+    for teacher in member['teachers'][day]:
+        if teacher['teacher_name'] not in lesson_ends:
+            for start in (first_start, first_start - 1, first_start + 1):
+                yield teacher, start
+
+
+def try_family_placement(member, teacher, day, start, placements, teachers_schedule, teachers_breaks,
+                         teachers_free_runs):
+    # Members are placed on the grids as they are chosen, so the next members see their lessons and break needs
+    teacher_name, nb_of_quarters = teacher['teacher_name'], member['nb_of_quarters']
+    if not (fits_free_run(teachers_free_runs[teacher_name][day], start, nb_of_quarters)
+            and teacher_can_still_take_breaks(teachers_breaks[teacher_name], teacher, start, nb_of_quarters)):
+        return False
+    assign_student_to_slot(teachers_schedule[teacher_name], day, start, nb_of_quarters, member['student'].index,
+                           teachers_breaks[teacher_name], teachers_free_runs[teacher_name])
+    placements.append((member, teacher, start))
+    return True
+
+
+def undo_family_placement(placements, teachers_schedule, teachers_breaks, teachers_free_runs):
+    for member, teacher, start in placements:
+        teacher_name = teacher['teacher_name']
+        unassign_student_from_slot(teachers_schedule[teacher_name], teacher['day'], start, member['nb_of_quarters'],
+                                   teachers_breaks[teacher_name], teachers_free_runs[teacher_name])
+    placements.clear()
+
+
+def student_and_teacher_are_at_same_location(student, teacher):
+    return student.location == teacher['location'] or student.can_be_realocated
+
+
+def add_to_process_students(processed_students, student, teacher_name='', day='', start=None, nb_of_quarters=0,
+                            assigned_with_siblings=False):
+    processed_students[student.index] = Assignment(student.index, teacher_name, day, start, nb_of_quarters,
+                                                  assigned_with_siblings)
+
+
+def describe_processed_students(processed_students, students, teacher_index, student_registry):
+    return [describe_processed_student(students.loc[assignment.student], assignment, teacher_index, student_registry)
+            for assignment in processed_students]
+
+
+def describe_processed_student(student, assignment, teacher_index, student_registry):
+    assigned = bool(assignment.teacher)
+    teacher_name, day = assignment.teacher, assignment.day
+    start_time = quarter_to_time(assignment.start) if assigned else ''
+    location = get_teacher_location_on_specific_day(teacher_name, day, teacher_index) if assigned else ''
+    ideal_timeslot = assigned and is_ideal_start(find_availability(student_registry, assignment.student), day,
+                                                 assignment.start)
+    ideal_teacher_match = assigned and (
+            student['preferred_teacher'] is None or student['preferred_teacher'] == teacher_name)
+    color = matching_type(ideal_teacher_match, location == student['location'])
+    return {'Nom Étudiant': student['student_name'],
+            'Élève actuel': student['current_student'],
+            'Enseignant': teacher_name,
+            'Instrument': student['instrument'],
+            'Âge': student['age'],
+            'Jour': day,
+            'Heure': start_time,
+            'Durée': student['lesson_duration'],
+            'Lieu': location,
+            'Assigné': assigned,
+            "Assigné à l'enseignant demandé": student['preferred_teacher'] == teacher_name,
+            "Enseignant demandé": student['preferred_teacher'],
+            'Plage horaire idéale': ideal_timeslot,
+            'Fratrie': student['simultaneous_family_class'],
+            'Assigné en même temps que la fraterie': assignment.with_siblings,
+            'Raison': reason_not_assigned(student, assignment, student_registry),
+            'Numéro de téléphone': student['phone_number'],
+            'Email': student['email'],
+            'Couleur': color}
+
+
+def reason_not_assigned(student, assignment, student_registry):
+    reason = infeasibility_reason(student_registry, assignment.student)
+    return REASONS[reason] if reason and not assignment.teacher and student['want_lesson'] else ''
+
+
+def matching_type(preferred_teacher, preferred_location):
+    if preferred_teacher and preferred_location:
+        return "Vert"
+    elif preferred_teacher and not preferred_location:
+        return "Bleu"
+    elif not preferred_teacher and preferred_location:
+        return "Jaune"
+    elif not preferred_teacher and not preferred_location:
+        return "Rouge"
+
+
+def new_best_iteration():
+    return {'processed_students': [], 'nb_of_assigned_students': -1, 'iteration': 0, 'time_to_best': 0.0,
+            'iterations': 0}
+
+
+def update_best_iteration(best, processed_students, iteration, elapsed):
+    nb_of_assigned_students = sum(1 for student in processed_students.values() if student.teacher)
+    if nb_of_assigned_students > best['nb_of_assigned_students']:
+        best.update(processed_students=list(processed_students.values()),
+                    nb_of_assigned_students=nb_of_assigned_students,
+                    iteration=iteration, time_to_best=elapsed)
+        return True
+    return False
+
+
+def merge_best_iterations(results):
+    best = max(results, key=lambda result: result['nb_of_assigned_students'])
+    return dict(best, iterations=sum(result['iterations'] for result in results))
+
+
+def rebuild_schedule(processed_students, teacher_index):
+    teachers_schedule = create_schedule(teacher_index)
+    for assignment in processed_students:
+        if assignment.teacher:
+            teacher_schedule = teachers_schedule.setdefault(assignment.teacher, {})
+            teacher_schedule.setdefault(assignment.day, new_day_schedule())
+            assign_student_to_slot(teacher_schedule, assignment.day, assignment.start, assignment.nb_of_quarters,
+                                   assignment.student)
+    return teachers_schedule
+
+
+def create_schedule(teacher_index):
+    teacher_schedule = {}
+    for teacher in teacher_index['teachers']:
+        day_schedule = teacher_schedule.setdefault(teacher['teacher_name'], {}).setdefault(teacher['day'],
+                                                                                          new_day_schedule())
+        for quarter in range(ceil_quarter(teacher['start_time']), floor_quarter(teacher['end_time'])):
+            day_schedule[quarter] = FREE
+    return teacher_schedule
+
+
+def create_time_slot_for_duration(start_time, length):
+    return ceil_quarter(start_time), int(length) // 15
+
+
+def assign_student_to_slot(teacher_schedule, day, start, nb_of_quarters, student_index, teacher_breaks=None,
+                           teacher_free_runs=None):
+    day_schedule = teacher_schedule[day]
+    for quarter in range(start, start + nb_of_quarters):
+        day_schedule[quarter] = student_index
+    if teacher_breaks and day in teacher_breaks:
+        update_break_windows(teacher_breaks[day], day_schedule, start, start + nb_of_quarters)
+    if teacher_free_runs and day in teacher_free_runs:
+        update_free_runs(teacher_free_runs[day], day_schedule, start, start + nb_of_quarters)
+
+
+def unassign_student_from_slot(teacher_schedule, day, start, nb_of_quarters, teacher_breaks=None,
+                               teacher_free_runs=None):
+    assign_student_to_slot(teacher_schedule, day, start, nb_of_quarters, FREE, teacher_breaks, teacher_free_runs)
+
+
+def assign_to_available_slot(teacher_schedule, teacher_breaks, teacher_free_runs, student_schedule,
+                             lesson_duration_in_quarter_hours, student, teacher, processed_students):
+    for day, timeslots in student_schedule.items():
+        if day != teacher['day']:
+            continue
+        for timeslot in free_starts(teacher_free_runs[day], timeslots, lesson_duration_in_quarter_hours):
+            if teacher_can_still_take_breaks(teacher_breaks, teacher, timeslot, lesson_duration_in_quarter_hours):
+                assign_student_to_slot(teacher_schedule, day, timeslot, lesson_duration_in_quarter_hours,
+                                       student.index, teacher_breaks, teacher_free_runs)
+                add_to_process_students(processed_students, student, teacher['teacher_name'], day, timeslot,
+                                        lesson_duration_in_quarter_hours, False)
+                return True
+    return False
+
+
+def is_slot_available(teacher_schedule, day, start, nb_of_quarters):
+    day_schedule = teacher_schedule.get(day)
+    if day_schedule is None or start < 0 or start + nb_of_quarters > QUARTERS_PER_DAY:
+        return False
+    return day_schedule[start:start + nb_of_quarters].count(FREE) == nb_of_quarters
+
+
+def teacher_can_still_take_breaks(teacher_breaks, teacher, lesson_start, nb_of_quarters):
+    return breaks_still_possible(teacher_breaks[teacher['day']], lesson_start, lesson_start + nb_of_quarters)
+
+
+def prepare_problem(students, teachers, previous_schedule=None):
+    students = students.reset_index(drop=True)
+    teacher_index = build_teacher_index(teachers)
+    nb_of_pinned_students = None
+    if previous_schedule is not None:
+        students, nb_of_pinned_students = pin_previous_assignments(students, previous_schedule, teacher_index)
+    student_registry = build_student_registry(students, teacher_index)
+    problem = {'students': students, 'teachers': teachers, 'teacher_index': teacher_index,
+               'student_registry': student_registry, 'nb_of_pinned_students': nb_of_pinned_students}
+    # The independent groups and their upper bounds are computed once, every solve reuses them. Groups share nothing,
+    # so the upper bound of the whole problem is the sum of theirs.
+    problem['sub_problems'] = split_problem(problem)
+    if problem['sub_problems']:
+        problem['upper_bound'] = sum(sub_problem['upper_bound'] for sub_problem in problem['sub_problems'])
+    else:
+        problem['upper_bound'] = upper_bound(students, teacher_index, student_registry)
+    return problem
+
+
+def upper_bound(students, teacher_index, student_registry):
+    # Pinned lessons are always kept, the other students can only use the time they leave free
+    teachers_schedule = create_schedule(teacher_index)
+    pinned_lessons = {}
+    for student_index in sorted(pinned_students(student_registry)):
+        force_student_assignment(find_record(student_registry, student_index), teachers_schedule, {}, {},
+                                 pinned_lessons)
+    return len(pinned_lessons) + max_placeable_students(students, teachers_schedule, student_registry,
+                                                        pinned_lessons)
+
+
+def split_problem(problem):
+    # One problem per group of students and teacher-days that never meet the others, none when there is only one
+    students, teachers = problem['students'], problem['teachers']
+    components = [component for component in connected_components(students, problem['student_registry'])
+                  if component['teacher_days']]
+    if len(components) < 2:
+        return []
+    sub_problems = []
+    for component in components:
+        component_students = students.loc[component['students']]
+        component_teachers = teachers.loc[[(teacher_name, day) in component['teacher_days']
+                                           for teacher_name, day in zip(teachers['teacher_name'], teachers['day'])]]
+        teacher_index = build_teacher_index(component_teachers)
+        student_registry = registry_subset(problem['student_registry'], component['students'])
+        sub_problems.append({'students': component_students, 'teachers': component_teachers,
+                             'teacher_index': teacher_index, 'student_registry': student_registry,
+                             'nb_of_pinned_students': None,
+                             'upper_bound': upper_bound(component_students, teacher_index, student_registry),
+                             'sub_problems': []})
+    return sub_problems
+
+
+def solve_component(problem, duration, seed, engine='heuristic'):
+    students, teacher_index, student_registry = problem['students'], problem['teacher_index'], \
+        problem['student_registry']
+    if engine != 'exact':
+        return search_iterations(students, teacher_index, student_registry, time.time() + (duration or 0), seed,
+                                 upper_bound=problem['upper_bound'])
+    deadline = time.time() + (duration or 0)
+    best = search_iterations(students, teacher_index, student_registry, time.time() + (duration or 0) / 2, seed,
+                             upper_bound=problem['upper_bound'])
+    return search_exactly(problem, best, deadline - time.time())
+
+
+def search_exactly(problem, best, duration):
+    # The best schedule of the heuristic search is the incumbent, unless it already reached the upper bound
+    start = time.perf_counter()
+    nb_of_heuristic_students = best['nb_of_assigned_students']
+    if nb_of_heuristic_students < problem['upper_bound']:
+        best = exact_search(problem['students'], problem['teacher_index'], problem['student_registry'], best,
+                            max(duration, 0), problem['upper_bound'])
+    else:
+        best = dict(best, nb_of_nodes=0, complete=True, siblings_held=False, optimal=True)
+    return dict(best, nb_of_heuristic_students=nb_of_heuristic_students, exact_elapsed=time.perf_counter() - start)
+
+
+def solve_components(sub_problems, students, student_registry, duration=0, seed=None, workers=1,
+                     engine='heuristic'):
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    # The time is shared by size, the largest groups first so the process pool is not left waiting for one at the end
+    sub_problems = sorted(sub_problems, key=lambda sub_problem: len(sub_problem['students']), reverse=True)
+    nb_of_students = sum(len(sub_problem['students']) for sub_problem in sub_problems)
+    nb_of_parallel_problems = min(max(workers, 1), len(sub_problems))
+    durations = [min(duration or 0, (duration or 0) * len(sub_problem['students']) / nb_of_students
+                     * nb_of_parallel_problems) for sub_problem in sub_problems]
+    seeds = [rng.randrange(2 ** 32) for _ in sub_problems]
+
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(solve_component, sub_problem, component_duration, component_seed, engine)
+                       for sub_problem, component_duration, component_seed in zip(sub_problems, durations, seeds)]
+            results = [future.result() for future in futures]
+    else:
+        results = [solve_component(sub_problem, component_duration, component_seed, engine)
+                   for sub_problem, component_duration, component_seed in zip(sub_problems, durations, seeds)]
+
+    return dict(merge_components(results, students, student_registry), workers=nb_of_parallel_problems,
+                elapsed=time.perf_counter() - start,
+                exact_search=summarize_exact_search(results) if engine == 'exact' else None)
+
+
+def merge_components(results, students, student_registry):
+    # The students of all groups in the order a single greedy pass processes them: by priority, each family placed
+    # together right after its first member
+    assignments = {assignment.student: assignment for result in results
+                   for assignment in result['processed_students']}
+    ranks = {student_index: rank for rank, student_index in enumerate(sort_students(student_registry))}
+
+    def processing_rank(assignment):
+        if not assignment.with_siblings:
+            return ranks[assignment.student], ranks[assignment.student]
+        family_ranks = [ranks[member] for member in find_family(student_registry, assignment.student)
+                        if member in assignments and assignments[member].with_siblings]
+        return min(family_ranks + [ranks[assignment.student]]), ranks[assignment.student]
+
+    processed_students = [assignments.get(student_index, Assignment(student_index, '', '', None, 0, False))
+                          for student_index in students.index]
+    return {'processed_students': sorted(processed_students, key=processing_rank),
+            'nb_of_assigned_students': sum(result['nb_of_assigned_students'] for result in results),
+            'iterations': sum(result['iterations'] for result in results),
+            'iteration': max(result['iteration'] for result in results),
+            'time_to_best': max(result['time_to_best'] for result in results)}
+
+
+# Outcome of Scheduler.solve, the assignments are in the order the students were processed and the students are
+# described as they are written to schedule.csv. Nothing is printed, the search figures are returned instead:
+# nb_of_groups is 0 when the students were searched as one group, exact_search is None for the heuristic engine.
+ScheduleResult = namedtuple('ScheduleResult', ['assignments', 'teachers_schedule', 'students',
+                                               'nb_of_assigned_students', 'iterations', 'iteration', 'time_to_best',
+                                               'upper_bound', 'workers', 'nb_of_groups', 'elapsed', 'exact_search'])
+
+
+class Scheduler:
+    # Everything a solve needs is built once here and only read afterwards, so one scheduler can be solved several
+    # times, and several schedulers can be solved at the same time, without sharing anything
+    def __init__(self, students, teachers, previous_schedule=None):
+        self._use_problem(prepare_problem(students, teachers, previous_schedule))
+
+    @classmethod
+    def from_problem(cls, problem):
+        scheduler = cls.__new__(cls)
+        scheduler._use_problem(problem)
+        return scheduler
+
+    def _use_problem(self, problem):
+        self.problem = problem
+        self.students = problem['students']
+        self.teachers = problem['teachers']
+        self.teacher_index = problem['teacher_index']
+        self.student_registry = problem['student_registry']
+        self.nb_of_pinned_students = problem['nb_of_pinned_students']
+        self.upper_bound = problem['upper_bound']
+        self.sub_problems = problem['sub_problems']
+
+    def solve(self, time_budget=0, seed=None, workers=1, engine='heuristic'):
+        if self.sub_problems:
+            best = solve_components(self.sub_problems, self.students, self.student_registry, time_budget, seed, workers,
+                                    engine)
+        elif engine == 'exact':
+            # Half the time budget goes to the heuristic search, the rest to proving or beating its best schedule
+            deadline = time.time() + (time_budget or 0)
+            best = search(self.students, self.teacher_index, self.student_registry, (time_budget or 0) / 2, seed,
+                          workers, self.upper_bound)
+            best = search_exactly(self.problem, best, deadline - time.time())
+            best['exact_search'] = summarize_exact_search([best])
+        else:
+            best = search(self.students, self.teacher_index, self.student_registry, time_budget, seed, workers,
+                          self.upper_bound)
+        teachers_schedule = rebuild_schedule(best['processed_students'], self.teacher_index)
+        students = describe_processed_students(best['processed_students'], self.students, self.teacher_index,
+                                               self.student_registry)
+        return ScheduleResult(best['processed_students'], teachers_schedule, students,
+                              best['nb_of_assigned_students'], best['iterations'], best['iteration'],
+                              best['time_to_best'], self.upper_bound, best['workers'], len(self.sub_problems),
+                              best['elapsed'], best.get('exact_search'))
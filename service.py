@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from http import HTTPStatus
+
+from breaks import create_break_windows
+from free_runs import create_free_runs
+from main import load_students, load_teachers
+from scheduler import Scheduler, create_time_slot_for_duration, describe_processed_students, feasible_placements
+from slot_grid import quarter_to_time
+from student_registry import PINNED_COLUMNS, normalize_name
+from teacher_index import teacher_location
+
+# A local scheduling service: the inputs are loaded and indexed once, the best schedule found so far is kept in memory
+# and placement questions are answered against it without running the whole pipeline again.
+# GET /status, GET /schedule, POST /feasible_slots, POST /pin and POST /improve take and return JSON.
+
+DEFAULT_STUDENT = {'preferred_teacher': math.nan, 'location': math.nan, 'can_be_realocated': True,
+                   'lesson_duration': 30, 'current_student': False, 'simultaneous_family_class': False,
+                   'alternative_day_1': math.nan, 'alternative_start_time_1': math.nan,
+                   'alternative_end_time_1': math.nan, 'alternative_day_2': math.nan,
+                   'alternative_start_time_2': math.nan, 'alternative_end_time_2': math.nan,
+                   'alternative_day_3': math.nan, 'alternative_start_time_3': math.nan,
+                   'alternative_end_time_3': math.nan, 'want_lesson': True, 'assigned_teacher': math.nan,
+                   'assigned_day': math.nan, 'assigned_start_time': math.nan, 'assigned_duration': math.nan}
+REQUIRED_STUDENT_FIELDS = ['instrument', 'ideal_day', 'ideal_start_time', 'ideal_end_time']
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def create_state(students, teachers, seed=None):
+    state = {'scheduler': Scheduler(students, teachers), 'seed': seed, 'improvement': None, 'searched_iterations': 0}
+    use_result(state, state['scheduler'].solve(0, seed))
+    return state
+
+
+def use_result(state, result):
+    scheduler = state['scheduler']
+    state['result'] = result
+    state['searched_iterations'] += result.iterations
+    # The free runs and break windows of the current schedule, to check placements against
+    state['teachers_breaks'] = create_break_windows(scheduler.teacher_index, result.teachers_schedule)
+    state['teachers_free_runs'] = create_free_runs(result.teachers_schedule)
+    state['updated_at'] = time.time()
+
+
+def status(state):
+    result = state['result']
+    return {'nb_of_students': len(result.students), 'nb_of_assigned_students': result.nb_of_assigned_students,
+            'searched_iterations': state['searched_iterations'], 'improving': state['improvement'] is not None,
+            'updated_at': state['updated_at']}
+
+
+def find_teacher_name(teacher_index, name):
+    teacher_names = {normalize_name(teacher_name): teacher_name for teacher_name in teacher_index['by_name']}
+    return teacher_names.get(normalize_name(name), name)
+
+
+def hypothetical_student(fields, teacher_index):
+    missing_fields = [field for field in REQUIRED_STUDENT_FIELDS if not fields.get(field)]
+    if missing_fields:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f'Missing student fields: {", ".join(missing_fields)}')
+    # Names, days and instruments are lower case in the cleaned up inputs
+    student = dict(DEFAULT_STUDENT)
+    student.update({key: value.strip().lower() if isinstance(value, str) else value for key, value in fields.items()})
+    if isinstance(fields.get('preferred_teacher'), str):
+        student['preferred_teacher'] = find_teacher_name(teacher_index, fields['preferred_teacher'])
+    return student
+
+
+def feasible_slots(state, fields):
+    scheduler = state['scheduler']
+    student = hypothetical_student(fields, scheduler.teacher_index)
+    placements = feasible_placements(student, scheduler.teacher_index, state['teachers_free_runs'],
+                                     state['teachers_breaks'])
+    return {'slots': [{'teacher': teacher['teacher_name'], 'day': teacher['day'], 'start_time': quarter_to_time(start),
+                       'location': teacher['location']} for teacher, start in placements]}
+
+
+def pin_impact(state, fields, seed=None):
+    for field in ('student_name', 'teacher', 'day', 'start_time'):
+        if not fields.get(field):
+            raise RequestError(HTTPStatus.BAD_REQUEST, f'Missing pin field: {field}')
+        if not isinstance(fields[field], str):
+            raise RequestError(HTTPStatus.BAD_REQUEST, f'The pin field {field} must be a string')
+    scheduler, current_result = state['scheduler'], state['result']
+    student_index = scheduler.student_registry['by_name'].get(normalize_name(fields['student_name']))
+    if student_index is None:
+        raise RequestError(HTTPStatus.NOT_FOUND, f'Unknown student: {fields["student_name"]}')
+    teacher_name, day = find_teacher_name(scheduler.teacher_index, fields['teacher']), fields['day'].strip().lower()
+    if not teacher_location(scheduler.teacher_index, teacher_name, day):
+        raise RequestError(HTTPStatus.NOT_FOUND, f'{fields["teacher"]} does not teach on {day}')
+
+    students = scheduler.students.copy()
+    students[PINNED_COLUMNS] = students[PINNED_COLUMNS].astype(object)
+    duration = int(fields.get('duration', students.loc[student_index, 'lesson_duration']))
+    students.loc[student_index, PINNED_COLUMNS] = [teacher_name, day, fields['start_time'].strip(), duration]
+    start, nb_of_quarters = create_time_slot_for_duration(fields['start_time'].strip(), duration)
+
+    # The lessons of the current schedule the pin does not overlap are pinned too, so only the students in the way
+    # are placed again and the comparison does not depend on how long the current schedule was searched for
+    kept_assignments = [assignment for assignment in current_result.assignments
+                        if assignment.teacher and assignment.student != student_index
+                        and not (assignment.teacher == teacher_name and assignment.day == day
+                                 and assignment.start < start + nb_of_quarters
+                                 and start < assignment.start + assignment.nb_of_quarters)]
+    kept_students = students.copy()
+    if kept_assignments:
+        kept_students.loc[[assignment.student for assignment in kept_assignments], PINNED_COLUMNS] = [
+            [assignment.teacher, assignment.day, quarter_to_time(assignment.start), assignment.nb_of_quarters * 15]
+            for assignment in kept_assignments]
+    pinned_result = Scheduler(kept_students, scheduler.teachers).solve(0, seed)
+
+    # Students assigned in the current schedule that the pinned schedule could not place anymore
+    still_assigned = {assignment.student for assignment in pinned_result.assignments if assignment.teacher}
+    displaced_students = [scheduler.students.loc[assignment.student, 'student_name']
+                          for assignment in current_result.assignments
+                          if assignment.teacher and assignment.student not in still_assigned]
+    impact = {'nb_of_assigned_students': current_result.nb_of_assigned_students,
+              'nb_of_assigned_students_with_pin': pinned_result.nb_of_assigned_students,
+              'displaced_students': displaced_students, 'applied': bool(fields.get('apply'))}
+    if not fields.get('apply'):
+        return impact, None
+
+    # Only the new pin is kept afterwards, the kept lessons stay free to move in later improvements
+    pinned_scheduler = Scheduler(students, scheduler.teachers)
+    with_siblings = {assignment.student: assignment.with_siblings for assignment in kept_assignments}
+    assignments = [assignment._replace(with_siblings=with_siblings.get(assignment.student, assignment.with_siblings))
+                   for assignment in pinned_result.assignments]
+    pinned_result = pinned_result._replace(
+        assignments=assignments, upper_bound=pinned_scheduler.upper_bound,
+        students=describe_processed_students(assignments, pinned_scheduler.students, pinned_scheduler.teacher_index,
+                                             pinned_scheduler.student_registry))
+    return impact, (pinned_scheduler, pinned_result)
+
+
+async def pin(state, fields):
+    # Schedulers are built and solved in a thread, the state is only updated from the event loop
+    current_result = state['result']
+    loop = asyncio.get_running_loop()
+    impact, pinned = await loop.run_in_executor(None, pin_impact, state, fields, state['seed'])
+    if pinned is not None:
+        if state['result'] is not current_result:
+            raise RequestError(HTTPStatus.CONFLICT, 'The schedule changed while the pin was checked')
+        state['scheduler'] = pinned[0]
+        use_result(state, pinned[1])
+    return impact
+
+
+async def improve(state, time_budget, seed=None):
+    # The search runs in a thread on its own copy of the grids, the state is only updated from the event loop
+    scheduler = state['scheduler']
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(None, scheduler.solve, time_budget, seed)
+        if scheduler is not state['scheduler']:
+            return
+        if result.nb_of_assigned_students > state['result'].nb_of_assigned_students:
+            use_result(state, result)
+        else:
+            state['searched_iterations'] += result.iterations
+    finally:
+        state['improvement'] = None
+
+
+def start_improvement(state, fields):
+    if state['improvement'] is not None:
+        raise RequestError(HTTPStatus.CONFLICT, 'An improvement is already running')
+    time_budget = float(fields.get('time_budget', 10))
+    seed = fields.get('seed', state['seed'])
+    state['improvement'] = asyncio.ensure_future(improve(state, time_budget, seed))
+    return {'started': True, 'time_budget': time_budget}
+
+
+def json_ready(value):
+    # Missing values become null and numpy scalars plain Python values
+    if isinstance(value, dict):
+        return {key: json_ready(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_ready(item) for item in value]
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+async def handle_request(state, method, path, body):
+    fields = json.loads(body) if body else {}
+    if not isinstance(fields, dict):
+        raise RequestError(HTTPStatus.BAD_REQUEST, 'The request body must be a JSON object')
+    if method == 'GET' and path == '/status':
+        return status(state)
+    if method == 'GET' and path == '/schedule':
+        return {'students': state['result'].students}
+    if method == 'POST' and path == '/feasible_slots':
+        return feasible_slots(state, fields)
+    if method == 'POST' and path == '/pin':
+        return await pin(state, fields)
+    if method == 'POST' and path == '/improve':
+        return start_improvement(state, fields)
+    raise RequestError(HTTPStatus.NOT_FOUND, f'No route for {method} {path}')
+
+
+async def serve_connection(state, reader, writer):
+    try:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        content_length = int(headers.get('content-length', 0))
+        try:
+            if len(request_line) < 2:
+                raise RequestError(HTTPStatus.BAD_REQUEST, 'Malformed request line')
+            if content_length > MAX_REQUEST_SIZE:
+                raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+            body = (await reader.readexactly(content_length)).decode('utf-8') if content_length else ''
+            response_status, response = HTTPStatus.OK, await handle_request(state, request_line[0], request_line[1],
+                                                                             body)
+        except RequestError as error:
+            response_status, response = error.status, {'error': str(error)}
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            response_status, response = HTTPStatus.BAD_REQUEST, {'error': str(error)}
+        payload = json.dumps(json_ready(response), ensure_ascii=False).encode('utf-8')
+        writer.write(f'HTTP/1.1 {response_status.value} {response_status.phrase}\r\n'
+                     f'Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(payload)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1') + payload)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(state, host='127.0.0.1', port=8765):
+    server = await asyncio.start_server(lambda reader, writer: serve_connection(state, reader, writer), host, port)
+    print(f'Scheduling service listening on http://{host}:{port}')
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Studio C local scheduling service')
+    students_group = parser.add_mutually_exclusive_group(required=True)
+    students_group.add_argument('-s', '--students_file', help='Path to the cleaned up students CSV file')
+    students_group.add_argument('--students_input', help='Path to the students registration form export')
+    teachers_group = parser.add_mutually_exclusive_group(required=True)
+    teachers_group.add_argument('-t', '--teachers_file', help='Path to the cleaned up teachers CSV file')
+    teachers_group.add_argument('--teachers_input', help='Path to the teachers input CSV file')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen to on the local machine')
+    parser.add_argument('--seed', type=int, required=False, help='Seed of the searches')
+    args = parser.parse_args()
+
+    service_state = create_state(load_students(args.students_file, args.students_input),
+                                 load_teachers(args.teachers_file, args.teachers_input), args.seed)
+    asyncio.run(serve(service_state, port=args.port))
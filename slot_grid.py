@@ -0,0 +1,28 @@
+from array import array
+
+# A teacher's day is an array of quarter-hours (minutes since midnight // 15). Each cell holds the index of the
+# student taking a lesson at that time, FREE when the teacher is available, or OFF when the teacher is not working.
+QUARTERS_PER_DAY = 96
+FREE = -1
+OFF = -2
+
+
+def new_day_schedule():
+    return array('i', [OFF]) * QUARTERS_PER_DAY
+
+
+def to_minutes(time):
+    hours, minutes = str(time).strip().split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def floor_quarter(time):
+    return to_minutes(time) // 15
+
+
+def ceil_quarter(time):
+    return -(-to_minutes(time) // 15)
+
+
+def quarter_to_time(quarter):
+    return f"{quarter // 4:02d}:{quarter % 4 * 15:02d}"
@@ -0,0 +1,125 @@
+import sys
+from collections import namedtuple
+
+import pandas as pd
+
+from availability import compile_availability
+from feasibility import check_feasibility
+from slot_grid import ceil_quarter
+
+# Lookup tables over the students, built once when the students are loaded. Students are identified by their row
+# index in the students frame, which is also what the teachers' schedules store.
+
+# What the search reads of a student, normalised once: no preferred teacher is None, the lesson duration is in
+# quarter-hours, and a pinned lesson is (teacher, day, start, nb_of_quarters, with_siblings) or None
+StudentRecord = namedtuple('StudentRecord', ['index', 'instrument', 'location', 'preferred_teacher', 'nb_of_quarters',
+                                             'can_be_realocated', 'want_lesson', 'pinned'])
+PINNED_COLUMNS = ['assigned_teacher', 'assigned_day', 'assigned_start_time', 'assigned_duration']
+# Order of instruments priority
+INSTRUMENT_ORDER = ["violon", "piano", "chant", "guitare", "ukulélé", "batterie / percussion"]
+PRIORITY_COLUMNS = ['assigned_teacher', 'simultaneous_family_class', 'current_student', 'instrument']
+
+
+def build_student_registry(students, teacher_index=None):
+    student_registry = {'by_name': {}, 'sibling': {}, 'family': {}, 'availability': compile_availability(students),
+                        'records': build_student_records(students), 'priorities': priority_ranks(students)}
+    if teacher_index is not None:
+        # Only registries built for a search know which teachers each student could have
+        student_registry.update(check_feasibility(students, teacher_index, student_registry['availability']))
+    for index, student_name in students['student_name'].items():
+        student_registry['by_name'].setdefault(normalize_name(student_name), index)
+
+    for index, simultaneous_family_class, sibling_name in zip(students.index, students['simultaneous_family_class'],
+                                                              students['sibling_name']):
+        if not simultaneous_family_class or not isinstance(sibling_name, str) or not sibling_name.strip():
+            continue
+        sibling = student_registry['by_name'].get(normalize_name(sibling_name))
+        if sibling is not None and sibling != index:
+            student_registry['sibling'][index] = sibling
+
+    # Students linked through sibling names, directly or not, form one family
+    families = {}
+    for index, sibling in student_registry['sibling'].items():
+        family = families.get(index, {index}) | families.get(sibling, {sibling})
+        for member in family:
+            families[member] = family
+    student_registry['family'] = {index: tuple(sorted(family)) for index, family in families.items()}
+    return student_registry
+
+
+def build_student_records(students):
+    pinned = students[PINNED_COLUMNS].notna().all(axis=1)
+    records = {}
+    for index, instrument, location, preferred_teacher, lesson_duration, can_be_realocated, want_lesson, \
+            simultaneous_family_class, is_pinned, assigned_teacher, assigned_day, assigned_start_time, \
+            assigned_duration in zip(students.index, students['instrument'], students['location'],
+                                     students['preferred_teacher'], students['lesson_duration'],
+                                     students['can_be_realocated'], students['want_lesson'],
+                                     students['simultaneous_family_class'], pinned,
+                                     *(students[column] for column in PINNED_COLUMNS)):
+        lesson = (interned(assigned_teacher), interned(assigned_day), ceil_quarter(assigned_start_time),
+                  int(assigned_duration) // 15, bool(simultaneous_family_class)) if is_pinned else None
+        records[index] = StudentRecord(
+            index, interned(instrument), interned(location),
+            None if pd.isna(preferred_teacher) or preferred_teacher == '' else interned(preferred_teacher),
+            int(lesson_duration) // 15, bool(can_be_realocated), bool(want_lesson), lesson)
+    return records
+
+
+def priority_ranks(students):
+    # Students with the same rank are processed in any order: pinned lessons first, then families taking lessons
+    # together, current students and instruments by priority
+    def instrument_idx(instrument):
+        return INSTRUMENT_ORDER.index(instrument) if instrument in INSTRUMENT_ORDER else len(INSTRUMENT_ORDER)
+
+    prioritized_students = students[PRIORITY_COLUMNS].sort_values(
+        by=PRIORITY_COLUMNS, ascending=[False, False, False, True], kind='stable',
+        key=lambda col: col.map(instrument_idx) if col.name == 'instrument' else col)
+    ranks = prioritized_students.assign(instrument=prioritized_students['instrument'].map(instrument_idx)).groupby(
+        PRIORITY_COLUMNS, sort=False, dropna=False).ngroup()
+    return dict(zip(students.index, ranks.reindex(students.index).tolist()))
+
+
+def interned(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def normalize_name(name):
+    return str(name).strip().lower()
+
+
+def find_family(student_registry, student_index):
+    return student_registry['family'].get(student_index, ())
+
+
+def find_record(student_registry, student_index):
+    return student_registry['records'][student_index]
+
+
+def pinned_students(student_registry):
+    return {index for index, record in student_registry['records'].items() if record.pinned}
+
+
+def find_availability(student_registry, student_index):
+    return student_registry['availability'][student_index]
+
+
+def infeasibility_reason(student_registry, student_index):
+    return student_registry.get('infeasibility_reasons', {}).get(student_index)
+
+
+def feasible_teachers(student_registry, student_index, teachers):
+    if 'feasible_teacher_days' not in student_registry:
+        return teachers
+    teacher_days = student_registry['feasible_teacher_days'].get(student_index, ())
+    return [teacher for teacher in teachers if (teacher['teacher_name'], teacher['day']) in teacher_days]
+
+
+def registry_subset(student_registry, student_indices):
+    # The registry of a group of students scheduled on their own, with the same indexes
+    student_indices = set(student_indices)
+    subset = {key: {index: value for index, value in lookup.items() if index in student_indices}
+              for key, lookup in student_registry.items() if key != 'by_name'}
+    subset['by_name'] = {name: index for name, index in student_registry['by_name'].items()
+                         if index in student_indices}
+    return subset
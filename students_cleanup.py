@@ -1,8 +1,28 @@
+import numpy as np
 import pandas as pd
 import argparse
 
+LOCATIONS = {'École de Rosemère - 399 Chemin de la Grande-Côte, Local A': 'Rosemere',
+             'École de Lorraine - 95 Boul. de Gaulle, Suite 205': 'Lorraine'}
+LESSON_DURATIONS = {'60 Minutes': 60, '45 Minutes': 45}
+NO_PREFERRED_TEACHER = ['Je ne sais pas / Pas de préférence', 'Je suis un nouvel élève']
+NO_OTHER_POSSIBILITY = "Non, pas d'autres possibilités"
+TIME_RANGE_COLUMNS = [('ideal_day', 'ideal_start_time', 'ideal_end_time')] + [
+    (f'alternative_day_{number}', f'alternative_start_time_{number}', f'alternative_end_time_{number}')
+    for number in (1, 2, 3)]
+
 
 def main(input_file, output_file):
+    df = clean_students(pd.read_csv(input_file))
+
+    # Save the transformed dataframe to a new CSV file.
+    df.to_csv(output_file, index=False)
+
+    report_unmatched_siblings(df)
+    report_invalid_time_ranges(df)
+
+
+def clean_students(df):
     # Mapping of old column names to new ones.
     column_mapping = {
         "Courriel": "email",
@@ -38,9 +58,6 @@ def main(input_file, output_file):
         "Âge de l'élève (requis pour les enfants seulement)": "age",
     }
 
-    # Read the CSV file.
-    df = pd.read_csv(input_file)
-
     # Select the columns from the dataframe based on the keys in column_mapping.
     df = df[list(column_mapping.keys())]
 
@@ -48,37 +65,76 @@ def main(input_file, output_file):
     df.rename(columns=column_mapping, inplace=True)
 
     # Clean up values.
-    df['want_lesson'] = df['want_lesson'].apply(lambda x: True if x == 'Oui' else False)
-    df['current_student'] = df['current_student'].apply(lambda x: True if x == 'Oui, je suis un élève actuel.' else False)
-    df['preferred_teacher'] = df['preferred_teacher'].apply(
-        lambda teacher_name: '' if teacher_name in ['Je ne sais pas / Pas de préférence', 'Je suis un nouvel élève', None] or pd.isna(teacher_name) else clean_preferred_teacher_name(teacher_name))
-    df['location'] = df['location'].apply(lambda x: 'Rosemere' if x == 'École de Rosemère - 399 Chemin de la Grande-Côte, Local A' else ('Lorraine' if x == 'École de Lorraine - 95 Boul. de Gaulle, Suite 205' else ''))
-    df['lesson_duration'] = df['lesson_duration'].apply(lambda x: 60 if x == '60 Minutes' else (45 if x == '45 Minutes' else 30))
-    df['can_be_realocated'] = df['can_be_realocated'].apply(lambda x: False if x == 'Impossible' else True)
-    df['alternative_day_2'] = df['alternative_day_2'].apply(lambda x: '' if x == "Non, pas d'autres possibilités" else x)
-    df['alternative_day_3'] = df['alternative_day_3'].apply(lambda x: '' if x == "Non, pas d'autres possibilités" else x)
-    df['simultaneous_family_class'] = df['simultaneous_family_class'].apply(lambda x: True if x == 'Oui' else False)
-    df['assigned_teacher'] = df['assigned_teacher'].apply(lambda teacher_name: '' if pd.isna(teacher_name) else clean_preferred_teacher_name(teacher_name))
-    df['assigned_duration'] = df['assigned_duration'].apply(lambda x: 60 if x == '60 Minutes' else (45 if x == '45 Minutes' else 30))
+    df['want_lesson'] = df['want_lesson'].eq('Oui')
+    df['current_student'] = df['current_student'].eq('Oui, je suis un élève actuel.')
+    df['preferred_teacher'] = clean_teacher_names(df['preferred_teacher'], NO_PREFERRED_TEACHER)
+    df['location'] = df['location'].map(LOCATIONS).fillna('')
+    df['lesson_duration'] = clean_durations(df['lesson_duration'])
+    df['can_be_realocated'] = df['can_be_realocated'].ne('Impossible')
+    df[['alternative_day_2', 'alternative_day_3']] = df[['alternative_day_2', 'alternative_day_3']].replace(
+        NO_OTHER_POSSIBILITY, '')
+    df['simultaneous_family_class'] = df['simultaneous_family_class'].eq('Oui')
+    df['assigned_teacher'] = clean_teacher_names(df['assigned_teacher'])
+    df['assigned_duration'] = clean_durations(df['assigned_duration'])
     # Trim spaces and convert to lowercase for the rest of the columns.
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            df[col] = df[col].str.strip().str.lower()
+    text_columns = df.columns[df.dtypes == 'object']
+    df[text_columns] = df[text_columns].apply(normalize_text)
+
+    # Empty values are missing values, as they would be when reading the cleaned up CSV file.
+    return df.where(df.ne(''))
+
+
+def report_unmatched_siblings(df):
+    # A sibling name matches when it is the name of another student, so a student's own name only matches if it
+    # appears more than once.
+    name_counts = df['student_name'].value_counts()
+    sibling_names = df['sibling_name'][df['sibling_name'].astype('string').str.strip().fillna('').ne('')]
+    matches = sibling_names.map(name_counts).fillna(0) - sibling_names.eq(df['student_name'][sibling_names.index])
+    for sibling_name in sibling_names[matches <= 0]:
+        print(f"Unmatched sibling name: {sibling_name}")
+
+
+def report_invalid_time_ranges(df):
+    # Times are parsed once for the whole column, an end time before the start time leaves no possible lesson
+    for day_column, start_column, end_column in TIME_RANGE_COLUMNS:
+        start_quarters = time_in_quarters(df[start_column])
+        end_quarters = time_in_quarters(df[end_column])
+        missing_times = start_quarters.isna() | end_quarters.isna()
+        invalid = df[day_column].notna() & (missing_times | (end_quarters < start_quarters))
+        columns = ['student_name', day_column, start_column, end_column]
+        for student_name, day, start_time, end_time in df.loc[invalid, columns].values:
+            print(f"Invalid time range for {student_name}: {day} {start_time} - {end_time}")
+
+
+def time_in_quarters(times):
+    return time_in_minutes(times).floordiv(15)
+
+
+def time_in_minutes(times):
+    hours_and_minutes = times.astype('string').str.extract(r'^\s*(\d{1,2})[:h](\d{2})')
+    return (pd.to_numeric(hours_and_minutes[0]) * 60 + pd.to_numeric(hours_and_minutes[1])).astype('Int64')
+
+
+def clean_durations(durations):
+    return durations.map(LESSON_DURATIONS).fillna(30).astype(int)
+
+
+def clean_teacher_names(teacher_names, no_preference=()):
+    # Only keep the name and the initial of the last name, "Justine L. (Piano)" becomes "Justine L."
+    teacher_names = teacher_names.astype(object).where(teacher_names.notna() & ~teacher_names.isin(no_preference), '')
+    return clean_distinct_values(teacher_names, lambda names: names.str.partition('.')[0] + names.str.partition('.')[1])
 
-    # Save the transformed dataframe to a new CSV file.
-    df.to_csv(output_file, index=False)
 
-    # Iterate through the rows, and for each non-empty sibling_name, check if it matches any student_name in other rows.
-    for index, sibling_name in df['sibling_name'].items():
-        if pd.notna(sibling_name) and sibling_name.strip():
-            # Check if the sibling_name exists in student_name of other rows.
-            if sibling_name not in df.loc[df.index != index, 'student_name'].values:
-                print(f"Unmatched sibling name: {sibling_name}")
+def normalize_text(column):
+    return clean_distinct_values(column, lambda values: values.str.strip().str.lower())
 
 
-def clean_preferred_teacher_name(teacher_name):
-    clean_teacher_name = teacher_name.split(".", 1)
-    return clean_teacher_name[0] + "." if len(clean_teacher_name) > 1 else teacher_name
+def clean_distinct_values(column, clean):
+    # Registration exports repeat the same answers, so each distinct answer is only cleaned once
+    codes, distinct_values = pd.factorize(column)
+    cleaned_values = np.append(clean(pd.Series(distinct_values, dtype=object)).to_numpy(dtype=object), np.nan)
+    # Missing values have the code -1, which picks the missing value appended at the end
+    return pd.Series(cleaned_values[codes], index=column.index, name=column.name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+# Lookup tables over the teachers' days, built once when the teachers are loaded. Each teacher-day record is a plain
+# dict with the same keys as a row of the teachers CSV file.
+
+
+def build_teacher_index(teachers):
+    teacher_index = {'teachers': [], 'by_instrument': {}, 'by_name': {}, 'location': {}}
+    for teacher in teachers.to_dict('records'):
+        teacher_index['teachers'].append(teacher)
+        teacher_index['by_name'].setdefault(teacher['teacher_name'], []).append(teacher)
+        teacher_index['location'].setdefault((teacher['teacher_name'], teacher['day']), teacher['location'])
+        if teacher['accept_new_student']:
+            for instrument in map(str.strip, str(teacher['instrument']).split(',')):
+                teacher_index['by_instrument'].setdefault(instrument, []).append(teacher)
+    return teacher_index
+
+
+def shuffle_teacher_index(teacher_index, rng):
+    shuffled_index = dict(teacher_index)
+    for lookup in ('by_instrument', 'by_name'):
+        shuffled_index[lookup] = {key: rng.sample(teachers, len(teachers))
+                                  for key, teachers in teacher_index[lookup].items()}
+    return shuffled_index
+
+
+def teachers_for_instrument(teacher_index, instrument):
+    return teacher_index['by_instrument'].get(instrument, [])
+
+
+def teachers_named(teacher_index, teacher_name):
+    return teacher_index['by_name'].get(teacher_name, [])
+
+
+def teaches_instrument(teacher_index, teacher_name, day, instrument):
+    return any(teacher['day'] == day and instrument in map(str.strip, str(teacher['instrument']).split(','))
+               for teacher in teachers_named(teacher_index, teacher_name))
+
+
+def teacher_location(teacher_index, teacher_name, day):
+    return teacher_index['location'].get((teacher_name, day), '')
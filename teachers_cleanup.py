@@ -1,22 +1,27 @@
 import pandas as pd
 import argparse
 
+from students_cleanup import normalize_text
+
 
 def main(input_file, output_file):
+    df = clean_teachers(pd.read_csv(input_file))
+
+    # Save the transformed dataframe to a new CSV file.
+    df.to_csv(output_file, index=False)
 
-    # Read the CSV file.
-    df = pd.read_csv(input_file)
+
+def clean_teachers(df):
     # Trim whitespace from the column names
     df.columns = df.columns.str.strip()
-    df['accept_new_student'] = df['accept_new_student'].apply(lambda x: True if x == 'Oui' else False)
+    df['accept_new_student'] = df['accept_new_student'].eq('Oui')
 
     # Trim spaces and convert to lowercase for the rest of the columns.
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            df[col] = df[col].str.strip().str.lower()
+    text_columns = df.columns[df.dtypes == 'object']
+    df[text_columns] = df[text_columns].apply(normalize_text)
 
-    # Save the transformed dataframe to a new CSV file.
-    df.to_csv(output_file, index=False)
+    # Empty values are missing values, as they would be when reading the cleaned up CSV file.
+    return df.where(df.ne(''))
 
 
 if __name__ == "__main__":
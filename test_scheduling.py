@@ -1,6 +1,32 @@
-from main import assign_students, run
+from benchmark import generate_problem
+from availability import available_starts, can_start_at, compile_availability, is_ideal_start
+from breaks import create_break_windows
+from components import connected_components
+from concurrent.futures import ThreadPoolExecutor
+from main import load_students, load_teachers, run
+from scheduler import Assignment, Scheduler, assign_students, assign_student_to_slot, create_schedule, \
+    describe_processed_students, exact_search, improve_schedule, is_slot_available, pin_previous_assignments, search, \
+    teacher_can_still_take_breaks, unassign_student_from_slot
+from student_registry import build_student_registry
+from students_cleanup import NO_PREFERRED_TEACHER, clean_teacher_names, report_unmatched_siblings, time_in_quarters
+from teacher_index import build_teacher_index
+from feasibility import REASONS
+from formatter import print_schedules, print_search_summary, print_stats
+from free_runs import create_free_runs, earliest_free_start, fits_free_run, free_starts
+from input_cache import cache_key, load_from_cache, save_to_cache
+from profiling import start_profiling
+from slot_grid import FREE, OFF
+import asyncio
+import json
+import main
+import scheduler
+import service
+import subprocess
+import sys
 import pandas as pd
 
+NAN = float('nan')
+
 
 # Sample test function
 def test_siblings_scheduled_consecutively():
@@ -56,3 +82,494 @@ def test_siblings_scheduled_consecutively():
     teachers = pd.DataFrame(teachers_data)
 
     run(students,teachers)
+
+
+def student_row(name, ideal_start_time, ideal_end_time, current_student=False, instrument='piano'):
+    return {
+        'student_name': name, 'instrument': instrument, 'location': 'School', 'current_student': current_student,
+        'lesson_duration': 30, 'ideal_day': 'lundi', 'ideal_start_time': ideal_start_time,
+        'ideal_end_time': ideal_end_time, 'alternative_day_1': NAN, 'alternative_start_time_1': NAN,
+        'alternative_end_time_1': NAN, 'alternative_day_2': NAN, 'alternative_start_time_2': NAN,
+        'alternative_end_time_2': NAN, 'alternative_day_3': NAN, 'alternative_start_time_3': NAN,
+        'alternative_end_time_3': NAN, 'simultaneous_family_class': False, 'sibling_name': NAN, 'age': 10,
+        'phone_number': '', 'email': '', 'can_be_realocated': False, 'want_lesson': True,
+        'assigned_teacher': NAN, 'assigned_day': NAN, 'assigned_start_time': NAN,
+        'assigned_duration': NAN, 'preferred_teacher': '',
+    }
+
+
+def teacher_row(name, start_time, end_time, instrument='piano', day='lundi'):
+    return {
+        'teacher_name': name, 'instrument': instrument, 'location': 'School', 'day': day,
+        'start_time': start_time, 'end_time': end_time, 'start_break_1': NAN, 'end_break_1': NAN,
+        'length_break_1': NAN, 'accept_new_student': True, 'start_break_2': NAN, 'end_break_2': NAN,
+        'length_break_2': NAN,
+    }
+
+
+def test_teacher_schedule_is_a_quarter_hour_grid():
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+
+    schedule = create_schedule(build_teacher_index(teachers))
+    lundi = schedule['Mr. Smith']['lundi']
+
+    assert [quarter for quarter, entry in enumerate(lundi) if entry == FREE] == [56, 57, 58, 59]
+    assert lundi.count(OFF) == len(lundi) - 4
+    assert is_slot_available(schedule['Mr. Smith'], 'lundi', 57, 3)
+    assert not is_slot_available(schedule['Mr. Smith'], 'lundi', 58, 3)
+
+
+def test_search_finds_a_better_ordering_than_the_greedy_pass():
+    # The greedy pass puts Alice at 14:00, which is the only time Bob can start
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30', current_student=True),
+                             student_row('Bob', '14:00', '14:00')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+
+    teacher_index, student_registry = build_teacher_index(teachers), build_student_registry(students)
+
+    _, processed_students = assign_students(teacher_index, student_registry)
+    assert not all(student.teacher for student in processed_students.values())
+
+    best = search(students, teacher_index, student_registry, duration=5, seed=1)
+    assert best['nb_of_assigned_students'] == 2
+
+
+def test_parallel_search_keeps_the_best_worker_result():
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30', current_student=True),
+                             student_row('Bob', '14:00', '14:00')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+
+    best = search(students, build_teacher_index(teachers), build_student_registry(students), duration=0, seed=1,
+                  workers=2)
+
+    assert best['iterations'] == 2
+    assert best['nb_of_assigned_students'] >= 1
+    assert all(isinstance(assignment, Assignment) for assignment in best['processed_students'])
+
+
+def test_break_windows_follow_assignments():
+    teacher = dict(teacher_row('Mr. Smith', '17:00', '20:00'), start_break_1='18:00', end_break_1='19:00',
+                   length_break_1=30)
+    teacher_index = build_teacher_index(pd.DataFrame([teacher]))
+    schedule = create_schedule(teacher_index)
+    breaks = create_break_windows(teacher_index, schedule)
+    teacher_schedule, teacher_breaks = schedule['Mr. Smith'], breaks['Mr. Smith']
+    record = teacher_index['teachers'][0]
+
+    # 18:00 to 18:30 taken, the break can still be taken from 18:30
+    assign_student_to_slot(teacher_schedule, 'lundi', 72, 2, 0, teacher_breaks)
+    assert teacher_can_still_take_breaks(teacher_breaks, record, 68, 4)
+    assert not teacher_can_still_take_breaks(teacher_breaks, record, 74, 1)
+
+    unassign_student_from_slot(teacher_schedule, 'lundi', 72, 2, teacher_breaks)
+    assert teacher_can_still_take_breaks(teacher_breaks, record, 74, 1)
+
+
+def test_free_runs_follow_assignments():
+    teacher_index = build_teacher_index(pd.DataFrame([teacher_row('Mr. Smith', '14:00', '17:00')]))
+    schedule = create_schedule(teacher_index)
+    teacher_schedule = schedule['Mr. Smith']
+    teacher_free_runs = create_free_runs(schedule)['Mr. Smith']
+    day_runs = teacher_free_runs['lundi']
+
+    # 15:00 to 15:30 and 16:00 to 16:15 taken, leaving runs of 4, 2 and 3 quarter-hours
+    assign_student_to_slot(teacher_schedule, 'lundi', 60, 2, 0, teacher_free_runs=teacher_free_runs)
+    assign_student_to_slot(teacher_schedule, 'lundi', 64, 1, 1, teacher_free_runs=teacher_free_runs)
+    for start in range(50, 72):
+        for nb_of_quarters in (1, 2, 3, 4, 5):
+            assert fits_free_run(day_runs, start, nb_of_quarters) == is_slot_available(teacher_schedule, 'lundi',
+                                                                                         start, nb_of_quarters)
+    assert earliest_free_start(day_runs, 58, 70, 3) == 65
+    assert earliest_free_start(day_runs, 58, 64, 3) is None
+    assert list(free_starts(day_runs, [56, 57, 58, 62, 65], 2)) == [56, 57, 58, 62, 65]
+    assert list(free_starts(day_runs, [66, 65, 62, 57], 3)) == [65, 57]
+
+    unassign_student_from_slot(teacher_schedule, 'lundi', 60, 2, teacher_free_runs=teacher_free_runs)
+    assert earliest_free_start(day_runs, 57, 70, 7) == 57
+    assert list(day_runs) == list(create_free_runs(schedule)['Mr. Smith']['lundi'])
+
+
+def test_families_of_three_are_placed_together():
+    students = pd.DataFrame([dict(student_row('Alice', '14:00', '15:00'), simultaneous_family_class=True,
+                                  sibling_name='bob'),
+                             dict(student_row('Bob', '14:00', '15:00'), simultaneous_family_class=True,
+                                  sibling_name='carol'),
+                             dict(student_row('Carol', '14:00', '15:00', instrument='guitare'),
+                                  simultaneous_family_class=True, sibling_name='alice')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '16:00'),
+                             teacher_row('Ms. Jones', '14:00', '16:00', instrument='guitare')])
+
+    _, processed_students = assign_students(build_teacher_index(teachers), build_student_registry(students))
+
+    # Bob right after Alice with the same teacher, Carol with her own teacher at the same time as Alice
+    assert [(assignment.teacher, assignment.start, assignment.with_siblings)
+            for assignment in processed_students.values()] == [('Mr. Smith', 56, True), ('Mr. Smith', 58, True),
+                                                               ('Ms. Jones', 56, True)]
+
+
+def test_student_registry_resolves_families_once():
+    students = pd.DataFrame([dict(student_row('Alice', '14:00', '15:00'), simultaneous_family_class=True,
+                                  sibling_name='bob '),
+                             dict(student_row('Bob', '14:00', '15:00'), simultaneous_family_class=True,
+                                  sibling_name='carol'),
+                             student_row('Carol', '14:00', '15:00'),
+                             dict(student_row('Dave', '14:00', '15:00'), sibling_name='alice')])
+
+    student_registry = build_student_registry(students)
+
+    assert student_registry['by_name']['carol'] == 2
+    assert student_registry['sibling'] == {0: 1, 1: 2}
+    assert student_registry['family'][0] == student_registry['family'][2] == (0, 1, 2)
+    assert 3 not in student_registry['family']
+
+
+def test_availability_is_compiled_once_per_student():
+    students = pd.DataFrame([dict(student_row('Alice', '14:10', '14:45'), alternative_day_1='lundi',
+                                  alternative_start_time_1='15:30', alternative_end_time_1='16:00',
+                                  alternative_day_2='mardi', alternative_start_time_2='9:00',
+                                  alternative_end_time_2='9:30'),
+                             dict(student_row('Bob', '14:00', '15:00'), ideal_day='')])
+
+    availability = compile_availability(students)
+
+    assert availability[0]['days'] == {'lundi': (57, 58, 59, 62, 63, 64), 'mardi': (36, 37, 38)}
+    assert can_start_at(availability[0], 'lundi', 62) and not can_start_at(availability[0], 'lundi', 60)
+    assert is_ideal_start(availability[0], 'lundi', 59) and not is_ideal_start(availability[0], 'lundi', 62)
+    assert availability[1]['days'] == {}
+    assert available_starts(availability[0]) is availability[0]['days']
+
+
+def test_students_no_teacher_can_take_are_explained_and_skipped():
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30'),
+                             student_row('Bob', '14:00', '14:30', instrument='harpe'),
+                             dict(student_row('Carol', '14:00', '14:30'), preferred_teacher='mrs. jones'),
+                             student_row('Dave', '18:00', '19:00'),
+                             dict(student_row('Eve', '14:00', '14:30'), location='Lorraine')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+
+    student_registry = build_student_registry(students, build_teacher_index(teachers))
+    assert student_registry['infeasibility_reasons'] == {1: 'instrument_not_taught', 2: 'unknown_preferred_teacher',
+                                                         3: 'outside_teacher_hours', 4: 'other_campus_only'}
+    assert student_registry['feasible_teacher_days'] == {0: {('Mr. Smith', 'lundi')}}
+
+    result = Scheduler(students, teachers).solve()
+    reasons = {student['Nom Étudiant']: student['Raison'] for student in result.students}
+    assert reasons == {'Alice': '', 'Bob': REASONS['instrument_not_taught'],
+                       'Carol': REASONS['unknown_preferred_teacher'], 'Dave': REASONS['outside_teacher_hours'],
+                       'Eve': REASONS['other_campus_only']}
+
+    # No teacher accepting new students teaches anything
+    teachers['accept_new_student'] = False
+    student_registry = build_student_registry(students, build_teacher_index(teachers))
+    assert student_registry['infeasibility_reasons'] == {0: 'instrument_not_taught', 1: 'instrument_not_taught',
+                                                         2: 'unknown_preferred_teacher', 3: 'instrument_not_taught',
+                                                         4: 'instrument_not_taught'}
+
+
+def test_search_stops_at_the_upper_bound(capsys):
+    # Bob and Carol can only start at 14:00, so one of them is left out whatever the schedule
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30'), student_row('Bob', '14:00', '14:00'),
+                             student_row('Carol', '14:00', '14:00'), student_row('Dave', '14:00', '14:30')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+
+    result = Scheduler(students, teachers).solve(time_budget=30, seed=1)
+    assert result.upper_bound == 2
+    assert result.nb_of_assigned_students == 2
+    assert result.iterations == 1
+
+    print_stats(result.students, result.teachers_schedule, result.upper_bound)
+    assert 'Student matched at 50.0%, no schedule can match more students.' in capsys.readouterr().out
+    print_stats(result.students, result.teachers_schedule, 3)
+    assert 'at most 75.0% can be matched (1 student(s) away from the upper bound)' in capsys.readouterr().out
+
+
+def test_upper_bound_counts_siblings_placed_outside_their_times():
+    # Bob follows Alice right after her lesson, outside his own times
+    students = pd.DataFrame([dict(student_row('Alice', '14:00', '14:00'), simultaneous_family_class=True,
+                                  sibling_name='bob'),
+                             dict(student_row('Bob', '14:00', '14:00'), simultaneous_family_class=True,
+                                  sibling_name='alice')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+
+    result = Scheduler(students, teachers).solve()
+    assert result.nb_of_assigned_students == 2
+    assert result.upper_bound == 2
+
+
+def test_exact_search_beats_the_greedy_incumbent(capsys):
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30', current_student=True),
+                             student_row('Bob', '14:00', '14:00'), student_row('Carol', '15:00', '15:00')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:30')])
+    teacher_index = build_teacher_index(teachers)
+    student_registry = build_student_registry(students, teacher_index)
+
+    # The greedy pass puts Alice at 14:00, the only time Bob can start
+    _, processed_students = assign_students(teacher_index, student_registry)
+    incumbent = {'processed_students': list(processed_students.values()), 'nb_of_assigned_students': 2}
+    best = exact_search(students, teacher_index, student_registry, incumbent, duration=5, upper_bound=3)
+
+    assert best['nb_of_assigned_students'] == 3
+    assert [(assignment.student, assignment.start) for assignment in best['processed_students']] == [
+        (0, 58), (1, 56), (2, 60)]
+
+    result = Scheduler(students, teachers).solve(time_budget=5, engine='exact')
+    assert result.upper_bound == 3
+    assert result.nb_of_assigned_students == 3
+    assert result.exact_search.optimal
+    print_search_summary(result)
+    assert 'the schedule is optimal' in capsys.readouterr().out
+
+    # Siblings are held in place, so exploring every branch does not prove the schedule optimal
+    siblings = pd.DataFrame([dict(student_row('Alice', '14:00', '14:00'), simultaneous_family_class=True,
+                                  sibling_name='bob'),
+                             dict(student_row('Bob', '14:00', '14:00'), simultaneous_family_class=True,
+                                  sibling_name='alice'),
+                             student_row('Carol', '14:00', '14:30')])
+    print_search_summary(Scheduler(siblings, teachers).solve(time_budget=1, engine='exact'))
+    assert 'no better schedule exists with the siblings placed together held in place' in capsys.readouterr().out
+
+
+def test_independent_groups_are_solved_apart_and_merged():
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30'), student_row('Bob', '14:00', '14:00'),
+                             student_row('Carol', '14:00', '14:30', instrument='violon'),
+                             student_row('Dave', '14:00', '14:00', instrument='batterie')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00'),
+                             teacher_row('Ms. Jones', '14:00', '15:00', instrument='violon')])
+    scheduler = Scheduler(students, teachers)
+
+    components = connected_components(scheduler.students, scheduler.student_registry)
+    assert [(component['students'], component['teacher_days']) for component in components] == [
+        ([0, 1], {('Mr. Smith', 'lundi')}), ([2], {('Ms. Jones', 'lundi')})]
+    assert [list(sub_problem['students'].index) for sub_problem in scheduler.sub_problems] == [[0, 1], [2]]
+
+    # Violin students come first, as in a single greedy pass
+    result = scheduler.solve(workers=2)
+    assert [assignment.student for assignment in result.assignments] == [2, 0, 1, 3]
+    assert result.nb_of_assigned_students == 3
+    assert [student['Enseignant'] for student in result.students] == ['Ms. Jones', 'Mr. Smith', 'Mr. Smith', '']
+
+    # A sibling taking lessons together links the two groups
+    students = students.astype({'sibling_name': object})
+    students.loc[[0, 2], 'simultaneous_family_class'] = True
+    students.loc[[0, 2], 'sibling_name'] = ['Carol', 'Alice']
+    scheduler = Scheduler(students, teachers)
+    assert [component['students'] for component in connected_components(scheduler.students,
+                                                                        scheduler.student_registry)] == [[0, 1, 2]]
+
+
+def test_previous_lessons_are_kept_when_rescheduling():
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+    teacher_index = build_teacher_index(teachers)
+    best = search(students, teacher_index, build_student_registry(students))
+    previous_schedule = pd.DataFrame(describe_processed_students(best['processed_students'], students, teacher_index,
+                                                                  build_student_registry(students)))
+    assert previous_schedule.loc[0, 'Heure'] == '14:00'
+
+    # A late registration who only fits at 14:00 and would come first in the greedy order
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30'),
+                             student_row('Bob', '14:00', '14:00', current_student=True)])
+    students, nb_of_pinned_students = pin_previous_assignments(students, previous_schedule, teacher_index)
+    best = search(students, teacher_index, build_student_registry(students))
+
+    assert nb_of_pinned_students == 1
+    assert [(assignment.student, assignment.start) for assignment in best['processed_students']
+            if assignment.teacher] == [(0, 56)]
+
+    # The lesson is not kept once the teacher stops teaching the instrument
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30')])
+    _, nb_of_pinned_students = pin_previous_assignments(students, previous_schedule,
+                                                        build_teacher_index(teachers.assign(instrument='chant')))
+    assert nb_of_pinned_students == 0
+
+
+def test_local_search_moves_students_to_make_room():
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30', current_student=True),
+                             student_row('Carol', '14:30', '15:00', current_student=True),
+                             student_row('Bob', '14:00', '14:00')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:30')])
+    teacher_index, student_registry = build_teacher_index(teachers), build_student_registry(students)
+
+    # The greedy pass puts Alice at 14:00 and Carol at 14:30, leaving no room for Bob
+    teachers_schedule, processed_students = assign_students(teacher_index, student_registry)
+    assert not processed_students[2].teacher
+
+    # Alice takes Carol's slot, Carol moves to 15:00 and Bob gets 14:00
+    assert improve_schedule(teacher_index, student_registry, teachers_schedule, processed_students) == 1
+    assert {assignment.student: assignment.start for assignment in processed_students.values()} == {0: 58, 1: 60,
+                                                                                                    2: 56}
+    assert list(teachers_schedule['Mr. Smith']['lundi'][56:62]) == [2, 2, 0, 0, 1, 1]
+
+
+def test_generated_registrations_have_the_cleaned_up_schema():
+    students, teachers = generate_problem(2, seed=7)
+    same_students, same_teachers = generate_problem(2, seed=7)
+    assert students.equals(same_students) and teachers.equals(same_teachers)
+    assert 'sibling_name' in students.columns and 'alternative_end_time_3' in students.columns
+    assert 'length_break_2' in teachers.columns
+    assert students['assigned_teacher'].notna().any()
+
+    student_registry = build_student_registry(students)
+    assert student_registry['sibling']
+    _, processed_students = assign_students(build_teacher_index(teachers), student_registry)
+    assert any(assignment.teacher for assignment in processed_students.values())
+
+
+def test_profiling_counts_hot_calls_and_restores_the_functions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    original_is_slot_available = scheduler.is_slot_available
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30'), student_row('Bob', '14:00', '14:30')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+
+    run(students, teachers, profiler=start_profiling([vars(scheduler), vars(main)]))
+
+    report = json.loads((tmp_path / 'profile.json').read_text())
+    assert report['counters']['placements'] == 2
+    assert report['counters']['free_starts'] >= 2
+    assert {'assign_students', 'print_schedules', 'output_to_csv'} <= set(report['phases'])
+    assert scheduler.is_slot_available is original_is_slot_available
+
+
+def test_in_memory_cleanup_schedules_like_the_cleaned_up_files(tmp_path):
+    students = load_students(students_input='students_input.csv', students_output=tmp_path / 'students.csv')
+    teachers = load_teachers(teachers_input='teachers_input.csv', teachers_output=tmp_path / 'teachers.csv')
+    students_from_file = load_students(tmp_path / 'students.csv')
+    teachers_from_file = load_teachers(tmp_path / 'teachers.csv')
+
+    _, processed_students = assign_students(build_teacher_index(teachers), build_student_registry(students))
+    _, processed_students_from_file = assign_students(build_teacher_index(teachers_from_file),
+                                                      build_student_registry(students_from_file))
+    assert processed_students == processed_students_from_file
+    assert students['want_lesson'].dtype == bool
+
+
+def test_cleanup_helpers_work_on_whole_columns(capsys):
+    assert list(clean_teacher_names(pd.Series(['Justine L. (Piano)', 'Je suis un nouvel élève', NAN, 'Thomas']),
+                                    NO_PREFERRED_TEACHER)) == ['Justine L.', '', '', 'Thomas']
+    assert list(time_in_quarters(pd.Series(['9:00', '19:45', NAN, 'soir'])).fillna(-1)) == [36, 79, -1, -1]
+
+    report_unmatched_siblings(pd.DataFrame({'student_name': ['alice', 'bob', 'carol'],
+                                            'sibling_name': ['bob', 'alice', 'carol']}))
+    assert capsys.readouterr().out == 'Unmatched sibling name: carol\n'
+
+
+def test_input_cache_is_keyed_by_content_and_bounded(tmp_path):
+    students_file = tmp_path / 'students.csv'
+    students_file.write_text('student_name\nalice\n')
+    key = cache_key([students_file, None])
+    assert key == cache_key([students_file, None])
+    assert key != cache_key([None, students_file])
+    teachers_file = tmp_path / 'teachers.csv'
+    teachers_file.write_text('b')
+    students_file.write_text('a')
+    split_key = cache_key([students_file, teachers_file])
+    students_file.write_text('ab')
+    teachers_file.write_text('')
+    assert split_key != cache_key([students_file, teachers_file])
+    students_file.write_text('student_name\nalice\n')
+
+    save_to_cache(key, {'students': ['alice']}, tmp_path / 'cache')
+    assert load_from_cache(key, tmp_path / 'cache') == {'students': ['alice']}
+    students_file.write_text('student_name\nbob\n')
+    assert load_from_cache(cache_key([students_file, None]), tmp_path / 'cache') is None
+
+    save_to_cache(cache_key([students_file, None]), {'students': ['bob']}, tmp_path / 'cache', max_cache_size=1)
+    assert load_from_cache(key, tmp_path / 'cache') is None
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
+
+
+def test_headless_runs_skip_the_console_rendering(tmp_path, monkeypatch, capsys):
+    imported = subprocess.run([sys.executable, '-c', 'import sys, main; print(sorted({"colorama", "pyfiglet"} '
+                               '& set(sys.modules)))'], capture_output=True, text=True, check=True)
+    assert imported.stdout.strip() == '[]'
+
+    monkeypatch.chdir(tmp_path)
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+    run(students, teachers, headless=True)
+
+    output = capsys.readouterr().out
+    assert '\033[' not in output and 'Horaire de' not in output
+    assert 'Horaire de Mr. Smith' in (tmp_path / 'schedules_visual.txt').read_text(encoding='utf-8')
+    assert (tmp_path / 'schedule.csv').exists()
+
+
+def test_schedules_are_rendered_in_colour_and_plain_text_at_once(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+    schedule = create_schedule(build_teacher_index(teachers))
+    assign_student_to_slot(schedule['Mr. Smith'], 'lundi', 56, 2, 0)
+
+    print_schedules(teachers, schedule, students)
+
+    console = capsys.readouterr().out
+    # An empty preferred teacher is not a missing one, so Alice is only at the school she asked for
+    assert "\033[93m" + "Alice".center(14) + "\033[0m" in console
+    plain = (tmp_path / 'schedules_visual.txt').read_text(encoding='utf-8')
+    assert plain.splitlines()[2:] == [line.replace("\033[93m", "").replace("\033[0m", "")
+                                      for line in console.splitlines()[5:]]
+
+
+def test_schedulers_solve_independently_and_repeatedly(capsys):
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30', current_student=True),
+                             student_row('Bob', '14:00', '14:00')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00')])
+    schedulers = [Scheduler(students, teachers), Scheduler(students, teachers.assign(end_time='14:30'))]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda solver: solver.solve(time_budget=1, seed=3), schedulers))
+    assert [result.nb_of_assigned_students for result in results] == [2, 1]
+    assert schedulers[0].solve(time_budget=1, seed=3).assignments == results[0].assignments
+    assert {student['Nom Étudiant'] for student in results[0].students} == {'Alice', 'Bob'}
+    # The search figures are returned, only the caller prints them
+    assert capsys.readouterr().out == ''
+    assert [(result.workers, result.nb_of_groups, result.exact_search) for result in results] == [(1, 0, None)] * 2
+
+
+def test_service_answers_placement_questions_from_the_current_schedule():
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:00'), student_row('Bob', '14:30', '14:30')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:30')])
+    state = service.create_state(students, teachers, seed=1)
+
+    async def ask(method, path, fields=None):
+        server = await asyncio.start_server(lambda reader, writer: service.serve_connection(state, reader, writer),
+                                            '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        body = json.dumps(fields or {}).encode()
+        writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+        response = await reader.read()
+        server.close()
+        return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+    slots = asyncio.run(ask('POST', '/feasible_slots', {'instrument': 'piano', 'ideal_day': 'lundi',
+                                                        'ideal_start_time': '14:00', 'ideal_end_time': '15:00'}))
+    assert [slot['start_time'] for slot in slots['slots']] == ['15:00']
+
+    impact = asyncio.run(ask('POST', '/pin', {'student_name': 'Carol', 'teacher': 'Mr. Smith', 'day': 'lundi',
+                                              'start_time': '14:00'}))
+    assert impact == {'error': 'Unknown student: Carol'}
+    impact = asyncio.run(ask('POST', '/pin', {'student_name': 'Alice', 'teacher': 'Mr. Smith', 'day': 5,
+                                              'start_time': '14:00'}))
+    assert impact == {'error': 'The pin field day must be a string'}
+    impact = asyncio.run(service.handle_request(state, 'POST', '/pin', json.dumps(
+        {'student_name': 'Alice', 'teacher': 'Mr. Smith', 'day': 'lundi', 'start_time': '14:15'})))
+    assert impact['displaced_students'] == ['Bob'] and impact['nb_of_assigned_students_with_pin'] == 1
+
+
+def test_service_pins_against_the_current_schedule():
+    # The greedy pass leaves Bob out, the search places him: pinning Carol elsewhere must not displace him
+    students = pd.DataFrame([student_row('Alice', '14:00', '14:30', current_student=True),
+                             student_row('Bob', '14:00', '14:00'),
+                             student_row('Carol', '14:00', '14:30', instrument='violon')])
+    teachers = pd.DataFrame([teacher_row('Mr. Smith', '14:00', '15:00'),
+                             teacher_row('Ms. Jones', '14:00', '15:00', instrument='violon')])
+    state = service.create_state(students, teachers, seed=1)
+    service.use_result(state, state['scheduler'].solve(5, 1))
+    assert state['result'].nb_of_assigned_students == 3
+
+    impact = asyncio.run(service.handle_request(state, 'POST', '/pin', json.dumps(
+        {'student_name': 'Carol', 'teacher': 'Ms. Jones', 'day': 'lundi', 'start_time': '14:30', 'apply': True})))
+    assert impact['displaced_students'] == [] and impact['nb_of_assigned_students_with_pin'] == 3
+    assert state['result'].nb_of_assigned_students == 3
+    assert pd.isna(state['scheduler'].students.loc[0, 'assigned_teacher'])